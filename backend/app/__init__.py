@@ -4,11 +4,26 @@ from app.db import db
 # Импорт моделей для регистрации
 from app.models import *
 from app.api import register_blueprints
+from app.api.compression import init_compression
+from app.api.json_provider import init_json
+from app.cli import register_commands
+from app.services.document_renderer import DocumentRenderer
+from app.services.render_cache import RenderCache
+from app.services.reservation_service import ReservationService
+from app.services.reference_cache import ReferenceCache
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object('config.Config')
+    init_json(app)
     db.init_app(app)
-    CORS(app)
+    RenderCache.init_app(app)
+    ReservationService.init_app(app)
+    ReferenceCache.init_app(app)
+    CORS(app, expose_headers=['X-Next-Cursor'])
     register_blueprints(app)
+    init_compression(app)
+    register_commands(app)
+    # Шаблоны печатных форм компилируются один раз при старте
+    DocumentRenderer.warm_up()
     return app 
\ No newline at end of file
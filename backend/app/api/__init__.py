@@ -5,6 +5,8 @@ from .invoice_api import invoice_api
 from .goods_receipt_api import goods_receipt_api
 from .goods_issue_api import goods_issue_api
 from .stock_api import stock_api
+from .export_api import export_api
+from .cache_api import cache_api
 
 def register_blueprints(app):
     app.register_blueprint(product_api)
@@ -13,4 +15,6 @@ def register_blueprints(app):
     app.register_blueprint(invoice_api)
     app.register_blueprint(goods_receipt_api)
     app.register_blueprint(goods_issue_api)
-    app.register_blueprint(stock_api) 
\ No newline at end of file
+    app.register_blueprint(stock_api)
+    app.register_blueprint(export_api)
+    app.register_blueprint(cache_api) 
\ No newline at end of file
@@ -0,0 +1,83 @@
+from flask import request, abort, current_app, stream_with_context
+from app.api.collection import parse_date_arg, iter_batches, STREAM_CHUNK_SIZE
+from app.services.document_queries import DocumentQueries
+from app.services.document_renderer import DocumentRenderer
+from app.services.render_cache import RenderCache
+
+# Максимальное количество документов в ?ids=
+BATCH_PRINT_MAX_IDS = 1000
+
+BATCH_PRINT_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <title>{title}</title>
+  <style>{styles}
+    .page + .page {{ page-break-before: always; break-before: page; }}
+  </style>
+</head>
+<body>
+"""
+
+BATCH_PRINT_TAIL = """</body>
+</html>
+"""
+
+def parse_ids_arg(name='ids'):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        ids = [int(doc_id) for doc_id in value.split(',') if doc_id.strip()]
+    except ValueError:
+        abort(400, f'Invalid {name}')
+    if len(ids) > BATCH_PRINT_MAX_IDS:
+        abort(400, f'Too many ids (max {BATCH_PRINT_MAX_IDS})')
+    return ids
+
+def batch_print_response(doc_type, query, date_column, context, version, title):
+    """Печатает пачку документов одним HTML-документом с разрывами страниц.
+
+    ?ids=3,1,2 - документы в указанном порядке;
+    ?date_from=&date_to= - документы за период в порядке даты.
+    Документы со строками загружаются несколькими запросами на всю выборку,
+    контрагенты и товары - из кэша справочников (см. DocumentQueries),
+    ответ отдаётся потоком по одному документу.
+    context(doc) и version(doc) - данные шаблона и версия документа для кэша форм.
+    """
+    entity = query.column_descriptions[0]['entity']
+    ids = parse_ids_arg()
+    if ids:
+        found = {document.id: document for document in query.filter(entity.id.in_(ids))}
+        missing = [doc_id for doc_id in ids if doc_id not in found]
+        if missing:
+            abort(404, f"Documents not found: {', '.join(map(str, missing))}")
+        documents = [found[doc_id] for doc_id in ids]
+    else:
+        date_from, date_to = parse_date_arg('date_from'), parse_date_arg('date_to')
+        if not date_from and not date_to:
+            abort(400, 'Specify ids or date_from/date_to')
+        if date_from:
+            query = query.filter(date_column >= date_from)
+        if date_to:
+            query = query.filter(date_column <= date_to)
+        documents = query.order_by(date_column, entity.id).yield_per(STREAM_CHUNK_SIZE)
+
+    template = f'{doc_type}.html'
+
+    def render_page(document):
+        return DocumentRenderer.render_block(template, 'content', **context(document))
+
+    def generate():
+        yield BATCH_PRINT_HEAD.format(title=title, styles=DocumentRenderer.render_block(template, 'styles'))
+        for batch in iter_batches(documents, STREAM_CHUNK_SIZE):
+            DocumentQueries.attach_references(batch)
+            for document in batch:
+                yield '<div class="page">'
+                yield RenderCache.get_or_render(
+                    doc_type, document.id, 'page', version(document), lambda: render_page(document)
+                )
+                yield '</div>\n'
+        yield BATCH_PRINT_TAIL
+
+    return current_app.response_class(stream_with_context(generate()), mimetype='text/html')
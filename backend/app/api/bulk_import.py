@@ -0,0 +1,41 @@
+from flask import request, abort, jsonify
+from app.services.bulk_import_service import BulkImportService
+from app.api.collection import NDJSON_MIMETYPE
+import io
+
+# Тип содержимого запроса -> формат файла
+IMPORT_MIMETYPES = {
+    'text/csv': 'csv',
+    NDJSON_MIMETYPE: 'ndjson',
+    'application/json': 'json',
+}
+
+def import_response(kind):
+    """Загружает справочник из тела запроса и возвращает отчёт BulkImportService.import_rows.
+
+    Формат - ?format=csv|ndjson или по Content-Type (text/csv, application/x-ndjson);
+    application/json - массив объектов. Тело CSV/NDJSON читается потоком.
+    ?chunk_size=N - строк в одной транзакции.
+    """
+    fmt = request.args.get('format') or IMPORT_MIMETYPES.get(request.mimetype)
+    if fmt not in BulkImportService.FORMATS + ('json',):
+        abort(400, 'Unknown import format: use ?format=csv|ndjson or Content-Type text/csv, application/x-ndjson')
+    chunk_size = request.args.get('chunk_size', type=int)
+    if chunk_size is not None and chunk_size < 1:
+        abort(400, 'Invalid chunk_size')
+    if fmt == 'json':
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            abort(400, 'Expected a JSON array of objects')
+        rows = (
+            (number, row, None) if isinstance(row, dict) else (number, None, 'Row must be a JSON object')
+            for number, row in enumerate(data, 1)
+        )
+    else:
+        stream = io.TextIOWrapper(io.BufferedReader(request.stream), encoding='utf-8-sig', newline='')
+        rows = BulkImportService.iter_rows(stream, fmt)
+    try:
+        report = BulkImportService.import_rows(kind, rows, chunk_size)
+    except UnicodeDecodeError:
+        abort(400, 'File must be UTF-8 encoded')
+    return jsonify(report)
@@ -0,0 +1,15 @@
+from flask import Blueprint, jsonify
+from app.services.reference_cache import ReferenceCache
+
+cache_api = Blueprint('cache_api', __name__, url_prefix='/api/cache')
+
+# Счётчики кэша справочников: попадания, промахи и количество записей по таблицам
+@cache_api.route('/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({'reference': ReferenceCache.stats()})
+
+# Сбросить кэш справочников (например, после правки базы в обход API)
+@cache_api.route('/reference', methods=['DELETE'])
+def clear_reference_cache():
+    ReferenceCache.clear()
+    return jsonify({'result': 'cleared'})
@@ -0,0 +1,226 @@
+from flask import request, jsonify, abort, current_app, stream_with_context
+from datetime import date, datetime
+import base64
+import json
+from app.db import db
+
+# Максимальный размер страницы для ?limit=
+MAX_LIMIT = 1000
+# Сколько строк читается из курсора БД за раз при потоковой выдаче
+STREAM_CHUNK_SIZE = 1000
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Сколько объектов сериализуется и отдаётся клиенту одной частью потокового ответа
+STREAM_WRITE_SIZE = 100
+
+def _encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def _decode_cursor(token):
+    try:
+        value, last_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except Exception:
+        abort(400, 'Invalid cursor')
+    return value, last_id
+
+def _cursor_value(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+def parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        abort(400, 'Invalid date format')
+
+def collection_query(query, sort_keys, default_sort='id', date_column=None, filters=None, ranges=None):
+    """Применяет к запросу коллекции фильтры, сортировку и keyset-курсор из параметров запроса.
+
+    ?date_from=&date_to= - период по date_column (включительно);
+    ?<фильтр>=значение - равенство по колонкам из filters {имя: (колонка, тип)};
+    ?<имя>_min=&<имя>_max= - диапазон (включительно) по числовым колонкам из ranges {имя: колонка};
+    ?sort=<ключ> или ?sort=-<ключ> - сортировка по ключу из sort_keys (+ id для однозначности);
+    ?cursor= - продолжение выборки после последней строки предыдущей страницы.
+    Возвращает (запрос, функция построения курсора по последней строке).
+    """
+    args = request.args
+    id_column = query.column_descriptions[0]['entity'].id
+    for name, (column, value_type) in (filters or {}).items():
+        if name in args:
+            value = args.get(name, type=value_type)
+            if value is None:
+                abort(400, f'Invalid value for {name}')
+            query = query.filter(column == value)
+    for name, column in (ranges or {}).items():
+        for suffix, compare in (('_min', column.__ge__), ('_max', column.__le__)):
+            if name + suffix in args:
+                value = args.get(name + suffix, type=float)
+                if value is None:
+                    abort(400, f'Invalid value for {name}{suffix}')
+                query = query.filter(compare(value))
+    if date_column is not None:
+        date_from, date_to = parse_date_arg('date_from'), parse_date_arg('date_to')
+        if date_from:
+            query = query.filter(date_column >= date_from)
+        if date_to:
+            query = query.filter(date_column <= date_to)
+
+    sort = args.get('sort', default_sort)
+    descending = sort.startswith('-')
+    key = sort.lstrip('-')
+    if key not in sort_keys:
+        abort(400, f"Unknown sort key: {key}. Allowed: {', '.join(sort_keys)}")
+    column = sort_keys[key]
+    keyset = [id_column] if column is id_column else [column, id_column]
+
+    cursor = args.get('cursor')
+    if cursor:
+        value, last_id = _decode_cursor(cursor)
+        if column is id_column:
+            row_value, bound = id_column, last_id
+        else:
+            if value is not None and column.type.python_type is date:
+                value = date.fromisoformat(value)
+            row_value = db.tuple_(column, id_column)
+            bound = db.tuple_(db.literal(value, column.type), db.literal(last_id))
+        query = query.filter(row_value < bound if descending else row_value > bound)
+
+    query = query.order_by(*[c.desc() if descending else c.asc() for c in keyset])
+
+    def next_cursor(row):
+        return _encode_cursor([_cursor_value(getattr(row, column.key)), row.id])
+    return query, next_cursor
+
+def iter_batches(iterable, size):
+    """Разбивает итератор на списки по size элементов"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def wants_ndjson():
+    """Клиент запросил построчный JSON (Accept: application/x-ndjson)"""
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+def wants_compact():
+    """Клиент запросил колоночный формат (?format=compact)"""
+    return request.args.get('format') == 'compact'
+
+def _dumps(item):
+    return current_app.json.dumps(item, separators=(',', ':'))
+
+def _compact_row(item, columns, nested):
+    """Значения объекта в порядке columns; вложенные списки объектов (строки документов) -
+    тоже массивами, их колонки запоминаются в nested"""
+    row = []
+    for column in columns:
+        value = item.get(column)
+        if isinstance(value, list) and value and isinstance(value[0], dict):
+            keys = nested.setdefault(column, list(value[0]))
+            value = [[line.get(key) for key in keys] for line in value]
+        row.append(value)
+    return row
+
+def compact(items):
+    """Колоночный формат: {"columns": [...], "rows": [[...], ...], "nested": {"items": [...]}}.
+
+    Имена полей передаются один раз, а не в каждом объекте; колонки берутся из первого объекта.
+    """
+    items = list(items)
+    columns = list(items[0]) if items else []
+    nested = {}
+    rows = [_compact_row(item, columns, nested) for item in items]
+    return {'columns': columns, 'rows': rows, 'nested': nested}
+
+def stream_json(items):
+    """Потоково отдаёт итератор объектов JSON-массивом, NDJSON (по заголовку Accept)
+    или в колоночном формате (?format=compact, см. compact).
+
+    Ответ формируется по частям, поэтому память не зависит от размера выборки;
+    объекты сериализуются и отдаются порциями по STREAM_WRITE_SIZE.
+    """
+    batches = iter_batches(items, STREAM_WRITE_SIZE)
+    if wants_compact():
+        def generate():
+            columns = None
+            nested = {}
+            for batch in batches:
+                if columns is None:
+                    columns = list(batch[0])
+                    yield '{"columns":' + _dumps(columns) + ',"rows":['
+                else:
+                    yield ','
+                yield _dumps([_compact_row(item, columns, nested) for item in batch])[1:-1]
+            if columns is None:
+                yield '{"columns":[],"rows":['
+            yield '],"nested":' + _dumps(nested) + '}\n'
+        mimetype = 'application/json'
+    elif wants_ndjson():
+        def generate():
+            for batch in batches:
+                yield ''.join(_dumps(item) + '\n' for item in batch)
+        mimetype = NDJSON_MIMETYPE
+    else:
+        def generate():
+            yield '['
+            first = True
+            for batch in batches:
+                # Порция сериализуется одним вызовом, скобки массива отбрасываются
+                yield ('' if first else ',') + _dumps(batch)[1:-1]
+                first = False
+            yield ']\n'
+        mimetype = 'application/json'
+    return current_app.response_class(stream_with_context(generate()), mimetype=mimetype)
+
+def _project(items, fields):
+    if not fields:
+        return items
+    fields = {field.strip() for field in fields.split(',') if field.strip()}
+    return ({key: value for key, value in item.items() if key in fields} for item in items)
+
+def collection_response(query, serialize, sort_keys, default_sort='id', date_column=None, filters=None, ranges=None,
+                        prepare=None):
+    """Отдаёт коллекцию JSON-массивом с фильтрами, сортировкой, пагинацией и проекцией.
+
+    ?limit=N - размер страницы (не больше MAX_LIMIT); если есть следующая страница,
+    её курсор передаётся в заголовке X-Next-Cursor.
+    Без limit вся коллекция отдаётся потоком (см. stream_json), строки читаются
+    из БД порциями по STREAM_CHUNK_SIZE.
+    ?fields=id,name - оставить в объектах только перечисленные поля.
+    ?format=compact - колоночный формат (см. compact).
+    prepare(rows) - вызывается для каждой порции строк перед сериализацией
+    (например, DocumentQueries.attach_references).
+    """
+    query, next_cursor = collection_query(query, sort_keys, default_sort, date_column, filters, ranges)
+    fields = request.args.get('fields')
+    limit = request.args.get('limit', type=int)
+    if limit is None:
+        rows = query.yield_per(STREAM_CHUNK_SIZE)
+        if prepare is not None:
+            rows = (row for batch in iter_batches(rows, STREAM_CHUNK_SIZE) for row in prepare(batch))
+        return stream_json(_project((serialize(row) for row in rows), fields))
+
+    limit = max(1, min(limit, MAX_LIMIT))
+    rows = query.limit(limit + 1).all()
+    cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = next_cursor(rows[-1])
+    if prepare is not None:
+        prepare(rows)
+    items = list(_project([serialize(row) for row in rows], fields))
+    if wants_compact():
+        response = jsonify(compact(items))
+    elif wants_ndjson():
+        response = stream_json(items)
+    else:
+        response = jsonify(items)
+    if cursor:
+        response.headers['X-Next-Cursor'] = cursor
+    return response
@@ -0,0 +1,77 @@
+from flask import request
+from app.api.collection import NDJSON_MIMETYPE
+import gzip
+import zlib
+try:
+    import brotli
+except ImportError:  # brotli не установлен - только gzip
+    brotli = None
+
+# Типы содержимого, которые имеет смысл сжимать (ZIP выгрузки уже сжат)
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', NDJSON_MIMETYPE, 'application/xml', 'text/html', 'text/csv', 'text/plain'
+}
+
+GZIP_LEVEL = 6
+# Качество brotli для ответов, сжимаемых на лету: заметно быстрее максимального при близком размере
+BROTLI_QUALITY = 5
+
+def _encoding():
+    """Лучшая кодировка из Accept-Encoding клиента среди поддерживаемых"""
+    supported = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(supported)
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def _compress_stream(chunks, encoding):
+    """Сжимает поток по мере выдачи: части отдаются, когда компрессор накопил блок"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 - формат gzip
+        compress, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield finish()
+
+def compress_response(response, min_size):
+    """Сжимает ответ gzip/brotli по Accept-Encoding.
+
+    Обычные ответы - если тело не меньше min_size байт; потоковые (списки без limit,
+    пакетная печать) сжимаются всегда, по частям.
+    """
+    if (
+        request.method == 'HEAD' or response.status_code != 200 or response.direct_passthrough
+        or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _encoding()
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        chunks = response.response
+        response.response = _compress_stream(response.iter_encoded(), encoding)
+        if hasattr(chunks, 'close'):
+            response.call_on_close(chunks.close)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(_compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_compression(app):
+    """Сжатие ответов (COMPRESS_RESPONSES, порог COMPRESS_MIN_SIZE байт)"""
+    if not app.config.get('COMPRESS_RESPONSES', True):
+        return
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+    app.after_request(lambda response: compress_response(response, min_size))
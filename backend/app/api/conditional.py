@@ -0,0 +1,45 @@
+from flask import request, current_app
+from app.services.data_version_service import DataVersionService
+import functools
+
+def conditional(*names):
+    """Условный GET: ETag и Last-Modified по версиям данных (см. DataVersionService).
+
+    names - версии, от которых зависит ответ; '{product_id}' подставляется из
+    параметров маршрута. Если клиент прислал совпадающий If-None-Match - 304 без вызова
+    обработчика; If-Modified-Since учитывается только без If-None-Match и только если
+    он позже последнего изменения (Last-Modified точен до секунды, две записи в одну
+    секунду не различить). ETag учитывает строку запроса и Accept, поэтому разные
+    выборки не смешиваются. Если версии не отслеживаются (см. DataVersionService.stamp),
+    ответ отдаётся всегда, без ETag.
+
+    Тело ответа не старше ETag: версии читаются в той же транзакции сессии до вызова
+    обработчика, а кэши, из которых собирается ответ, сверяются с теми же версиями
+    (ReferenceCache - по data_version записей, RenderCache - по отпечатку данных).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, last_modified = DataVersionService.stamp(
+                [name.format(**kwargs) for name in names],
+                request.full_path, request.headers.get('Accept', '')
+            )
+            if etag is None:
+                return view(*args, **kwargs)
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = (
+                    request.if_modified_since is not None
+                    and request.if_modified_since > last_modified
+                )
+            response = current_app.response_class(status=304) if not_modified \
+                else current_app.make_response(view(*args, **kwargs))
+            if response.status_code in (200, 304):
+                response.set_etag(etag, weak=True)
+                response.last_modified = last_modified
+                # Браузер хранит ответ, но каждый раз сверяет версию с сервером
+                response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
@@ -1,80 +1,77 @@
 from flask import Blueprint, request, jsonify, abort
 from app.models.models import Customer
 from app.db import db
+from app.api.collection import collection_response
+from app.api.bulk_import import import_response
+from app.services.reference_cache import ReferenceCache
+from app.api.conditional import conditional
+from werkzeug.exceptions import HTTPException
 import traceback
 
 customer_api = Blueprint('customer_api', __name__, url_prefix='/api/customers')
 
-# Получить список всех клиентов
+def serialize_customer(c):
+    return {
+        'id': c.id,
+        'name': c.name,
+        'type': c.type,
+        'address': c.address,
+        'phone': c.phone,
+        'email': c.email,
+        'edrpou': c.edrpou,
+        'ipn': c.ipn,
+        'bank_name': c.bank_name,
+        'bank_account': c.bank_account,
+        'mfo': c.mfo,
+        'contact_person': c.contact_person,
+        'contact_phone': c.contact_phone,
+        'contact_email': c.contact_email,
+        'discount': c.discount,
+        'credit_limit': c.credit_limit,
+        'payment_terms': c.payment_terms,
+        'notes': c.notes,
+        'country': c.country,
+        'city': c.city,
+        'postal_code': c.postal_code,
+        'website': c.website,
+        'tax_system': c.tax_system,
+        'vat_payer': c.vat_payer,
+        'vat_certificate': c.vat_certificate
+    }
+
+# Получить список клиентов (фильтры, сортировка, пагинация - см. collection_response)
 @customer_api.route('/', methods=['GET'])
+@conditional('customer')
 def get_customers():
     try:
-        customers = Customer.query.all()
-        return jsonify([
-            {
-                'id': c.id,
-                'name': c.name,
-                'type': c.type,
-                'address': c.address,
-                'phone': c.phone,
-                'email': c.email,
-                'edrpou': c.edrpou,
-                'ipn': c.ipn,
-                'bank_name': c.bank_name,
-                'bank_account': c.bank_account,
-                'mfo': c.mfo,
-                'contact_person': c.contact_person,
-                'contact_phone': c.contact_phone,
-                'contact_email': c.contact_email,
-                'discount': c.discount,
-                'credit_limit': c.credit_limit,
-                'payment_terms': c.payment_terms,
-                'notes': c.notes,
-                'country': c.country,
-                'city': c.city,
-                'postal_code': c.postal_code,
-                'website': c.website,
-                'tax_system': c.tax_system,
-                'vat_payer': c.vat_payer,
-                'vat_certificate': c.vat_certificate
-            } for c in customers
-        ])
+        return collection_response(
+            Customer.query,
+            serialize_customer,
+            sort_keys={'id': Customer.id, 'name': Customer.name},
+            filters={
+                'type': (Customer.type, str),
+                'city': (Customer.city, str),
+                'edrpou': (Customer.edrpou, str)
+            }
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[ERROR] get_customers: {e}")
         print(f"[ERROR] Traceback: {traceback.format_exc()}")
         return jsonify({'error': str(e)}), 500
 
+# Массовая загрузка клиентов из CSV/NDJSON (обновление по ЕДРПОУ) - см. import_response
+@customer_api.route('/import', methods=['POST'])
+def import_customers():
+    return import_response('customers')
+
 # Получить клиента по id
 @customer_api.route('/<int:customer_id>', methods=['GET'])
+@conditional('customer/{customer_id}')
 def get_customer(customer_id):
     customer = Customer.query.get_or_404(customer_id)
-    return jsonify({
-        'id': customer.id,
-        'name': customer.name,
-        'type': customer.type,
-        'address': customer.address,
-        'phone': customer.phone,
-        'email': customer.email,
-        'edrpou': customer.edrpou,
-        'ipn': customer.ipn,
-        'bank_name': customer.bank_name,
-        'bank_account': customer.bank_account,
-        'mfo': customer.mfo,
-        'contact_person': customer.contact_person,
-        'contact_phone': customer.contact_phone,
-        'contact_email': customer.contact_email,
-        'discount': customer.discount,
-        'credit_limit': customer.credit_limit,
-        'payment_terms': customer.payment_terms,
-        'notes': customer.notes,
-        'country': customer.country,
-        'city': customer.city,
-        'postal_code': customer.postal_code,
-        'website': customer.website,
-        'tax_system': customer.tax_system,
-        'vat_payer': customer.vat_payer,
-        'vat_certificate': customer.vat_certificate
-    })
+    return jsonify(serialize_customer(customer))
 
 # Создать нового клиента
 @customer_api.route('/', methods=['POST'])
@@ -110,6 +107,7 @@ def create_customer():
     )
     db.session.add(customer)
     db.session.commit()
+    ReferenceCache.invalidate(Customer, [customer.id])
     return jsonify({'id': customer.id}), 201
 
 # Обновить клиента
@@ -144,6 +142,7 @@ def update_customer(customer_id):
     customer.vat_payer = data.get('vat_payer', customer.vat_payer)
     customer.vat_certificate = data.get('vat_certificate', customer.vat_certificate)
     db.session.commit()
+    ReferenceCache.invalidate(Customer, [customer_id])
     return jsonify({'result': 'success'})
 
 # Удалить клиента
@@ -152,4 +151,5 @@ def delete_customer(customer_id):
     customer = Customer.query.get_or_404(customer_id)
     db.session.delete(customer)
     db.session.commit()
+    ReferenceCache.invalidate(Customer, [customer_id])
     return jsonify({'result': 'deleted'}) 
\ No newline at end of file
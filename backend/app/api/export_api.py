@@ -0,0 +1,111 @@
+from flask import Blueprint, request, abort, current_app, stream_with_context
+from app.models.models import Invoice, GoodsReceipt, GoodsIssue
+from app.api.collection import parse_date_arg, iter_batches
+from app.api.invoice_api import render_invoice
+from app.api.goods_receipt_api import render_goods_receipt
+from app.api.goods_issue_api import render_goods_issue
+from app.services.document_queries import DocumentQueries
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import hashlib
+import json
+import zipfile
+
+export_api = Blueprint('export_api', __name__, url_prefix='/api/export')
+
+# Тип документа -> (запрос с жадной загрузкой, колонка даты, функция рендера)
+EXPORT_TYPES = {
+    'invoice': (lambda: DocumentQueries.invoices(with_lines=True), Invoice.date, render_invoice),
+    'goods_issue': (DocumentQueries.goods_issues, GoodsIssue.date, render_goods_issue),
+    'goods_receipt': (DocumentQueries.goods_receipts, GoodsReceipt.date, render_goods_receipt),
+}
+
+# Сколько документов загружается и отдаётся пулу потоков за раз
+EXPORT_BATCH_SIZE = 100
+
+class ZipStream:
+    """Приёмник для zipfile без seek: копит записанные байты, генератор забирает их порциями"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def _render_xml(render, document):
+    content = render(document, 'xml').encode('utf-8')
+    return content, hashlib.sha256(content).hexdigest()
+
+# Выгрузка XML всех документов за период одним ZIP-архивом
+# GET  /api/export/xml?date_from=&date_to=&types=invoice,goods_issue,goods_receipt
+# POST - то же, в теле {"known": {"invoice/12.xml": "<sha256>", ...}} из прошлого manifest.json:
+#        документы с совпавшей контрольной суммой в архив не попадают (инкрементальная выгрузка)
+@export_api.route('/xml', methods=['GET', 'POST'])
+def export_xml():
+    date_from, date_to = parse_date_arg('date_from'), parse_date_arg('date_to')
+    if not date_from or not date_to:
+        abort(400, 'date_from and date_to are required')
+    types = request.args.get('types')
+    types = [t.strip() for t in types.split(',') if t.strip()] if types else list(EXPORT_TYPES)
+    unknown = [t for t in types if t not in EXPORT_TYPES]
+    if unknown:
+        abort(400, f"Unknown document types: {', '.join(unknown)}. Allowed: {', '.join(EXPORT_TYPES)}")
+    known = {}
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        known = data.get('known') or {}
+        if not isinstance(known, dict):
+            abort(400, 'known must be an object {file: sha256}')
+    workers = current_app.config.get('EXPORT_WORKERS', 4)
+
+    def generate():
+        stream = ZipStream()
+        manifest = {
+            'date_from': date_from.isoformat(),
+            'date_to': date_to.isoformat(),
+            'generated_at': datetime.utcnow().isoformat(),
+            'documents': []
+        }
+        with ThreadPoolExecutor(max_workers=workers) as executor, \
+                zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for doc_type in types:
+                query, date_column, render = EXPORT_TYPES[doc_type]
+                entity = date_column.class_
+                documents = query().filter(date_column.between(date_from, date_to)).order_by(
+                    date_column, entity.id
+                ).yield_per(EXPORT_BATCH_SIZE)
+                # Документы, их строки и справочники загружены заранее, итоги хранятся в заголовках, поэтому в потоках только рендер шаблонов
+                for batch in iter_batches(documents, EXPORT_BATCH_SIZE):
+                    DocumentQueries.attach_references(batch)
+                    rendered = executor.map(lambda document: _render_xml(render, document), batch)
+                    for document, (content, checksum) in zip(batch, rendered):
+                        name = f'{doc_type}/{document.id}.xml'
+                        included = known.get(name) != checksum
+                        if included:
+                            archive.writestr(name, content)
+                        manifest['documents'].append({
+                            'type': doc_type,
+                            'id': document.id,
+                            'date': document.date.isoformat(),
+                            'file': name,
+                            'sha256': checksum,
+                            'size': len(content),
+                            'included': included
+                        })
+                    yield stream.take()
+            archive.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2))
+        yield stream.take()
+
+    filename = f'export_{date_from.isoformat()}_{date_to.isoformat()}.zip'
+    response = current_app.response_class(stream_with_context(generate()), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
@@ -1,52 +1,32 @@
-from flask import Blueprint, request, jsonify, abort, render_template_string
-from app.models.models import GoodsIssue, GoodsIssueItem, Product, Customer
+from flask import Blueprint, request, jsonify, abort, Response
+from app.models.models import GoodsIssue, GoodsIssueItem, Product, Customer, Order
 from app.services.fifo_service import FIFOService
+from app.services.stock_checkpoint_service import StockCheckpointService
+from app.services.stock_repost_service import StockRepostService
 from app.db import db
+from app.services.document_renderer import DocumentRenderer
+from app.services.render_cache import RenderCache
+from app.services.document_totals import DocumentTotals
+from app.services.document_posting_service import DocumentPostingService
+from app.services.reservation_service import ReservationService
+from app.api.collection import collection_response
+from app.api.batch_print import batch_print_response
+from app.api.retry import retry_on_stock_conflict
+from app.services.document_queries import DocumentQueries
+from app.api.conditional import conditional
 from datetime import datetime
 from app.utils.number_to_words import number_to_words_ua
 
 goods_issue_api = Blueprint('goods_issue_api', __name__, url_prefix='/api/goods_issues')
 
-# Получить список всех расходных накладных
-@goods_issue_api.route('/', methods=['GET'])
-def get_goods_issues():
-    issues = GoodsIssue.query.all()
-    return jsonify([
-        {
-            'id': i.id,
-            'date': i.date.isoformat(),
-            'number': i.number,
-            'customer_id': i.customer_id,
-            'customer_name': i.customer.name if i.customer else None,
-            'contract': i.contract,
-            'warehouse': i.warehouse,
-            'organization': i.organization,
-            'operation_type': i.operation_type,
-            'responsible': i.responsible,
-            'comment': i.comment,
-            'pricing_note': i.pricing_note,
-            'items': [
-                {
-                    'id': item.id,
-                    'product_id': item.product_id,
-                    'product_name': item.product.name if item.product else None,
-                    'quantity': item.quantity,
-                    'price': item.price
-                } for item in i.items
-            ]
-        } for i in issues
-    ])
-
-# Получить расходную накладную по id
-@goods_issue_api.route('/<int:issue_id>', methods=['GET'])
-def get_goods_issue(issue_id):
-    i = GoodsIssue.query.get_or_404(issue_id)
-    return jsonify({
+def serialize_goods_issue(i):
+    return {
         'id': i.id,
         'date': i.date.isoformat(),
         'number': i.number,
         'customer_id': i.customer_id,
         'customer_name': i.customer.name if i.customer else None,
+        'order_id': i.order_id,
         'contract': i.contract,
         'warehouse': i.warehouse,
         'organization': i.organization,
@@ -54,6 +34,9 @@ def get_goods_issue(issue_id):
         'responsible': i.responsible,
         'comment': i.comment,
         'pricing_note': i.pricing_note,
+        'total': i.total,
+        'total_vat': i.total_vat,
+        'line_count': i.line_count,
         'items': [
             {
                 'id': item.id,
@@ -63,28 +46,55 @@ def get_goods_issue(issue_id):
                 'price': item.price
             } for item in i.items
         ]
-    })
+    }
+
+def check_order(order_id):
+    """400, если указан несуществующий заказ"""
+    if order_id is not None and db.session.get(Order, order_id) is None:
+        abort(400, f'Unknown order: {order_id}')
+
+# Получить список расходных накладных (фильтры, сортировка, пагинация - см. collection_response)
+@goods_issue_api.route('/', methods=['GET'])
+@conditional('goods_issue', 'customer', 'product')
+def get_goods_issues():
+    return collection_response(
+        DocumentQueries.goods_issues(),
+        serialize_goods_issue,
+        sort_keys={'id': GoodsIssue.id, 'date': GoodsIssue.date, 'total': GoodsIssue.total},
+        date_column=GoodsIssue.date,
+        filters={'customer_id': (GoodsIssue.customer_id, int)},
+        ranges={'total': GoodsIssue.total},
+        prepare=DocumentQueries.attach_references
+    )
+
+# Получить расходную накладную по id
+@goods_issue_api.route('/<int:issue_id>', methods=['GET'])
+@conditional('goods_issue/{issue_id}', 'customer', 'product')
+def get_goods_issue(issue_id):
+    i = DocumentQueries.goods_issues().get_or_404(issue_id)
+    DocumentQueries.attach_references([i])
+    return jsonify(serialize_goods_issue(i))
 
-# Создать новую расходную накладную с позициями
+# Создать новую расходную накладную с позициями (order_id - заказ, чей резерв уменьшается на отгруженное)
 @goods_issue_api.route('/', methods=['POST'])
+@retry_on_stock_conflict
 def create_goods_issue():
     data = request.get_json()
     if not data or not data.get('date') or not data.get('items'):
         abort(400, 'Missing required fields: date, items')
-    stock_errors = FIFOService.validate_stock_for_issue(data['items'])
-    if stock_errors:
-        return jsonify({
-            'error': 'Insufficient stock',
-            'details': stock_errors
-        }), 400
+    for item in data['items']:
+        if not item.get('product_id') or not item.get('quantity'):
+            abort(400, 'Each item must have product_id and quantity')
     try:
         issue_date = datetime.fromisoformat(data['date'])
     except Exception:
         abort(400, 'Invalid date format')
+    check_order(data.get('order_id'))
     issue = GoodsIssue(
         date=issue_date,
         number=data.get('number'),
         customer_id=data.get('customer_id'),
+        order_id=data.get('order_id'),
         contract=data.get('contract'),
         warehouse=data.get('warehouse'),
         organization=data.get('organization'),
@@ -94,26 +104,53 @@ def create_goods_issue():
         pricing_note=data.get('pricing_note')
     )
     db.session.add(issue)
-    db.session.flush()  # Получить id накладной
+    issue_items = []
     for item in data['items']:
-        if not item.get('product_id') or not item.get('quantity'):
-            abort(400, 'Each item must have product_id and quantity')
         issue_item = GoodsIssueItem(
-            goods_issue_id=issue.id,
+            goods_issue=issue,
             product_id=item['product_id'],
             quantity=item['quantity'],
             price=item.get('price')
         )
         db.session.add(issue_item)
+        issue_items.append(issue_item)
+    # Проверка остатков и списание по FIFO в одной транзакции с накладной
+    stock_errors = FIFOService.consume_stock_bulk(issue_items)
+    if stock_errors:
+        db.session.rollback()
+        return jsonify({
+            'error': 'Insufficient stock',
+            'details': stock_errors
+        }), 400
+    StockCheckpointService.on_document_change(issue.date)
+    DocumentTotals.store('goods_issue', [issue.id])
+    # Отгруженное по заказу уменьшает его резерв
+    ReservationService.refresh_orders([issue.order_id])
     db.session.commit()
-    for item in data['items']:
-        FIFOService.consume_stock(item['product_id'], item['quantity'])
     return jsonify({'id': issue.id}), 201
 
+# Пакетное проведение расходных накладных: тело - массив документов в формате POST /,
+# ответ - результат по каждому документу (см. DocumentPostingService)
+@goods_issue_api.route('/bulk', methods=['POST'])
+def post_goods_issues():
+    data = request.get_json(silent=True)
+    if not isinstance(data, list) or not data:
+        abort(400, 'Expected a non-empty JSON array of documents')
+    if len(data) > DocumentPostingService.MAX_DOCUMENTS:
+        abort(400, f'Too many documents (max {DocumentPostingService.MAX_DOCUMENTS})')
+    chunk_size = request.args.get('chunk_size', type=int)
+    if chunk_size is not None and chunk_size < 1:
+        abort(400, 'Invalid chunk_size')
+    return jsonify(DocumentPostingService.post_issues(data, chunk_size))
+
 # Обновить расходную накладную и её позиции
 @goods_issue_api.route('/<int:issue_id>', methods=['PUT'])
+@retry_on_stock_conflict
 def update_goods_issue(issue_id):
     i = GoodsIssue.query.get_or_404(issue_id)
+    old_date = i.date
+    old_order_id = i.order_id
+    old_lines = StockRepostService.snapshot_lines(i.items)
     data = request.get_json()
     if not data:
         abort(400, 'No input data')
@@ -126,6 +163,9 @@ def update_goods_issue(issue_id):
         i.number = data['number']
     if 'customer_id' in data:
         i.customer_id = data['customer_id']
+    if 'order_id' in data:
+        check_order(data['order_id'])
+        i.order_id = data['order_id']
     if 'contract' in data:
         i.contract = data['contract']
     if 'warehouse' in data:
@@ -141,10 +181,11 @@ def update_goods_issue(issue_id):
     if 'pricing_note' in data:
         i.pricing_note = data['pricing_note']
     if 'items' in data:
-        GoodsIssueItem.query.filter_by(goods_issue_id=i.id).delete()
         for item in data['items']:
             if not item.get('product_id') or not item.get('quantity'):
                 abort(400, 'Each item must have product_id and quantity')
+        GoodsIssueItem.query.filter_by(goods_issue_id=i.id).delete()
+        for item in data['items']:
             issue_item = GoodsIssueItem(
                 goods_issue_id=i.id,
                 product_id=item['product_id'],
@@ -152,16 +193,43 @@ def update_goods_issue(issue_id):
                 price=item.get('price')
             )
             db.session.add(issue_item)
+        DocumentTotals.store('goods_issue', [i.id])
+    if 'date' in data or 'items' in data:
+        # Перепроводим списания только по изменившимся товарам
+        stock_errors = StockRepostService.repost_issue(old_date, old_lines, i)
+        if stock_errors:
+            db.session.rollback()
+            return jsonify({
+                'error': 'Insufficient stock',
+                'details': stock_errors
+            }), 400
+        StockCheckpointService.on_document_change(old_date, i.date)
+    if 'items' in data or 'order_id' in data:
+        ReservationService.refresh_orders([old_order_id, i.order_id])
     db.session.commit()
+    RenderCache.invalidate('goods_issue', issue_id)
     return jsonify({'result': 'success'})
 
 # Удалить расходную накладную и её позиции
 @goods_issue_api.route('/<int:issue_id>', methods=['DELETE'])
+@retry_on_stock_conflict
 def delete_goods_issue(issue_id):
     i = GoodsIssue.query.get_or_404(issue_id)
+    old_lines = StockRepostService.snapshot_lines(i.items)
     GoodsIssueItem.query.filter_by(goods_issue_id=i.id).delete()
     db.session.delete(i)
+    stock_errors = StockRepostService.repost_issue(i.date, old_lines)
+    if stock_errors:
+        db.session.rollback()
+        return jsonify({
+            'error': 'Insufficient stock',
+            'details': stock_errors
+        }), 400
+    StockCheckpointService.on_document_change(i.date)
+    # Отгрузка отменена - резерв заказа возвращается
+    ReservationService.refresh_orders([i.order_id])
     db.session.commit()
+    RenderCache.invalidate('goods_issue', issue_id)
     return jsonify({'result': 'deleted'}) 
 
 PRINT_TEMPLATE_ISSUE_UA = """
@@ -170,7 +238,7 @@ PRINT_TEMPLATE_ISSUE_UA = """
 <head>
   <meta charset=\"utf-8\">
   <title>Видаткова накладна №{{ issue.number }}</title>
-  <style>
+  <style>{% block styles %}
     body { font-family: Arial, sans-serif; }
     table { border-collapse: collapse; width: 100%; margin-top: 20px; }
     th, td { border: 1px solid #333; padding: 6px 10px; text-align: left; }
@@ -179,9 +247,9 @@ PRINT_TEMPLATE_ISSUE_UA = """
     .footer { margin-top: 30px; }
     .customer-info { margin-bottom: 15px; }
     .total-words { margin-top: 15px; font-weight: bold; }
-  </style>
+  {% endblock %}</style>
 </head>
-<body>
+<body>{% block content %}
   <div class=\"header\">
     <h2>Видаткова накладна №{{ issue.number }} від {{ issue.date.strftime('%d.%m.%Y') }}</h2>
     <div class=\"customer-info\">
@@ -259,29 +327,47 @@ PRINT_TEMPLATE_ISSUE_UA = """
     <div>Відповідальний: {{ issue.responsible or '____________________' }}</div>
     <div>Підпис: ____________________</div>
   </div>
-</body>
+{% endblock %}</body>
 </html>
 """
 
+DocumentRenderer.register('goods_issue.html', PRINT_TEMPLATE_ISSUE_UA)
+
+def goods_issue_context(i, fmt='html'):
+    """Данные для шаблона расходной накладной"""
+    # Итоги хранятся в заголовке документа
+    totals = DocumentTotals.of_header(i)
+    context = dict(issue=i, total=totals['total'], total_vat=totals['total_vat'], total_wo_vat=totals['total_wo_vat'])
+    if fmt == 'html':
+        context.update(number_to_words_ua=number_to_words_ua, total_words=number_to_words_ua(totals['total']))
+    return context
+
+def goods_issue_version(i):
+    """Версия расходной накладной для кэша готовых форм"""
+    return RenderCache.fingerprint(i, i.customer, i.items, [item.product for item in i.items])
+
+def render_goods_issue(i, fmt):
+    """Печатная форма (fmt='html') или XML (fmt='xml') расходной накладной; готовый результат кэшируется"""
+    return RenderCache.get_or_render(
+        'goods_issue', i.id, fmt, goods_issue_version(i),
+        lambda: DocumentRenderer.render(f'goods_issue.{fmt}', **goods_issue_context(i, fmt))
+    )
+
 @goods_issue_api.route('/<int:issue_id>/print', methods=['GET'])
+@conditional('goods_issue/{issue_id}', 'customer', 'product')
 def print_goods_issue(issue_id):
-    i = GoodsIssue.query.get_or_404(issue_id)
-    # Считаем total
-    total = sum((item.price or 0) * (item.quantity or 0) for item in i.items)
-    vat_rate = 0.2
-    total_vat = total * vat_rate / (1 + vat_rate)
-    total_wo_vat = total - total_vat
-    total_words = number_to_words_ua(total)
-    html = render_template_string(
-        PRINT_TEMPLATE_ISSUE_UA,
-        issue=i,
-        number_to_words_ua=number_to_words_ua,
-        total=total,
-        total_vat=total_vat,
-        total_wo_vat=total_wo_vat,
-        total_words=total_words
+    i = DocumentQueries.goods_issues().get_or_404(issue_id)
+    DocumentQueries.attach_references([i])
+    return render_goods_issue(i, 'html')
+
+# Печать нескольких расходных накладных одним документом: ?ids=1,2,3 или ?date_from=&date_to=
+@goods_issue_api.route('/print', methods=['GET'])
+@conditional('goods_issue', 'customer', 'product')
+def print_goods_issues():
+    return batch_print_response(
+        'goods_issue', DocumentQueries.goods_issues(), GoodsIssue.date,
+        goods_issue_context, goods_issue_version, 'Видаткові накладні'
     )
-    return html 
 
 XML_TEMPLATE_ISSUE_UA = """<?xml version="1.0" encoding="utf-8"?>
 <ЕлектроннийДокумент>
@@ -347,22 +433,11 @@ XML_TEMPLATE_ISSUE_UA = """<?xml version="1.0" encoding="utf-8"?>
 </ЕлектроннийДокумент>
 """
 
+DocumentRenderer.register('goods_issue.xml', XML_TEMPLATE_ISSUE_UA)
+
 @goods_issue_api.route('/<int:issue_id>/xml', methods=['GET'])
+@conditional('goods_issue/{issue_id}', 'customer', 'product')
 def xml_goods_issue(issue_id):
-    i = GoodsIssue.query.get_or_404(issue_id)
-    # Считаем total
-    total = sum((item.price or 0) * (item.quantity or 0) for item in i.items)
-    vat_rate = 0.2
-    total_vat = total * vat_rate / (1 + vat_rate)
-    total_wo_vat = total - total_vat
-    
-    xml_content = render_template_string(
-        XML_TEMPLATE_ISSUE_UA,
-        issue=i,
-        total=total,
-        total_vat=total_vat,
-        total_wo_vat=total_wo_vat
-    )
-    
-    from flask import Response
-    return Response(xml_content, mimetype='application/xml') 
\ No newline at end of file
+    i = DocumentQueries.goods_issues().get_or_404(issue_id)
+    DocumentQueries.attach_references([i])
+    return Response(render_goods_issue(i, 'xml'), mimetype='application/xml') 
\ No newline at end of file
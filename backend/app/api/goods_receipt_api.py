@@ -1,53 +1,27 @@
-from flask import Blueprint, request, jsonify, abort, render_template_string
+from flask import Blueprint, request, jsonify, abort, Response
 from app.models.models import GoodsReceipt, GoodsReceiptItem, Product, Customer
 from app.services.fifo_service import FIFOService
+from app.services.stock_checkpoint_service import StockCheckpointService
+from app.services.stock_repost_service import StockRepostService
 from app.db import db
+from app.services.document_renderer import DocumentRenderer
+from app.services.render_cache import RenderCache
+from app.services.document_totals import DocumentTotals
+from app.services.document_posting_service import DocumentPostingService
+from app.api.collection import collection_response
+from app.api.batch_print import batch_print_response
+from app.api.retry import retry_on_stock_conflict
+from werkzeug.exceptions import HTTPException
+from app.services.document_queries import DocumentQueries
+from app.api.conditional import conditional
 from datetime import datetime
 from app.utils.number_to_words import number_to_words_ua
 import traceback
 
 goods_receipt_api = Blueprint('goods_receipt_api', __name__, url_prefix='/api/goods_receipts')
 
-# Получить список всех приходных накладных
-@goods_receipt_api.route('/', methods=['GET'])
-def get_goods_receipts():
-    try:
-        receipts = GoodsReceipt.query.all()
-        return jsonify([
-            {
-                'id': r.id,
-                'date': r.date.isoformat(),
-                'number': r.number,
-                'supplier_id': r.supplier_id,
-                'supplier_name': r.supplier.name if r.supplier else None,
-                'contract': r.contract,
-                'warehouse': r.warehouse,
-                'organization': r.organization,
-                'operation_type': r.operation_type,
-                'responsible': r.responsible,
-                'comment': r.comment,
-                'pricing_note': r.pricing_note,
-                'items': [
-                    {
-                        'id': item.id,
-                        'product_id': item.product_id,
-                        'product_name': item.product.name if item.product else None,
-                        'quantity': item.quantity,
-                        'price': item.price
-                    } for item in r.items
-                ]
-            } for r in receipts
-        ])
-    except Exception as e:
-        print(f"[ERROR] get_goods_receipts: {e}")
-        print(f"[ERROR] Traceback: {traceback.format_exc()}")
-        return jsonify({'error': str(e)}), 500
-
-# Получить приходную накладную по id
-@goods_receipt_api.route('/<int:receipt_id>', methods=['GET'])
-def get_goods_receipt(receipt_id):
-    r = GoodsReceipt.query.get_or_404(receipt_id)
-    return jsonify({
+def serialize_goods_receipt(r):
+    return {
         'id': r.id,
         'date': r.date.isoformat(),
         'number': r.number,
@@ -60,6 +34,9 @@ def get_goods_receipt(receipt_id):
         'responsible': r.responsible,
         'comment': r.comment,
         'pricing_note': r.pricing_note,
+        'total': r.total,
+        'total_vat': r.total_vat,
+        'line_count': r.line_count,
         'items': [
             {
                 'id': item.id,
@@ -69,10 +46,40 @@ def get_goods_receipt(receipt_id):
                 'price': item.price
             } for item in r.items
         ]
-    })
+    }
+
+# Получить список приходных накладных (фильтры, сортировка, пагинация - см. collection_response)
+@goods_receipt_api.route('/', methods=['GET'])
+@conditional('goods_receipt', 'customer', 'product')
+def get_goods_receipts():
+    try:
+        return collection_response(
+            DocumentQueries.goods_receipts(),
+            serialize_goods_receipt,
+            sort_keys={'id': GoodsReceipt.id, 'date': GoodsReceipt.date, 'total': GoodsReceipt.total},
+            date_column=GoodsReceipt.date,
+            filters={'supplier_id': (GoodsReceipt.supplier_id, int)},
+            ranges={'total': GoodsReceipt.total},
+            prepare=DocumentQueries.attach_references
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[ERROR] get_goods_receipts: {e}")
+        print(f"[ERROR] Traceback: {traceback.format_exc()}")
+        return jsonify({'error': str(e)}), 500
+
+# Получить приходную накладную по id
+@goods_receipt_api.route('/<int:receipt_id>', methods=['GET'])
+@conditional('goods_receipt/{receipt_id}', 'customer', 'product')
+def get_goods_receipt(receipt_id):
+    r = DocumentQueries.goods_receipts().get_or_404(receipt_id)
+    DocumentQueries.attach_references([r])
+    return jsonify(serialize_goods_receipt(r))
 
 # Создать новую приходную накладную с позициями
 @goods_receipt_api.route('/', methods=['POST'])
+@retry_on_stock_conflict
 def create_goods_receipt():
     data = request.get_json()
     if not data or not data.get('date') or not data.get('items'):
@@ -94,25 +101,45 @@ def create_goods_receipt():
         pricing_note=data.get('pricing_note')
     )
     db.session.add(receipt)
-    db.session.flush()  # Получить id накладной
     for item in data['items']:
         if not item.get('product_id') or not item.get('quantity'):
             abort(400, 'Each item must have product_id and quantity')
         receipt_item = GoodsReceiptItem(
-            goods_receipt_id=receipt.id,
+            goods_receipt=receipt,
             product_id=item['product_id'],
             quantity=item['quantity'],
             price=item.get('price')
         )
         db.session.add(receipt_item)
+        # Партия создаётся в одной транзакции с накладной
+        db.session.add(FIFOService.batch_from_receipt_item(receipt_item))
+    db.session.flush()  # Получить id накладной
+    StockCheckpointService.on_document_change(receipt.date)
+    DocumentTotals.store('goods_receipt', [receipt.id])
     db.session.commit()
-    FIFOService.create_batches_from_receipt(receipt.id)
     return jsonify({'id': receipt.id}), 201
 
+# Пакетное проведение приходных накладных: тело - массив документов в формате POST /,
+# ответ - результат по каждому документу (см. DocumentPostingService)
+@goods_receipt_api.route('/bulk', methods=['POST'])
+def post_goods_receipts():
+    data = request.get_json(silent=True)
+    if not isinstance(data, list) or not data:
+        abort(400, 'Expected a non-empty JSON array of documents')
+    if len(data) > DocumentPostingService.MAX_DOCUMENTS:
+        abort(400, f'Too many documents (max {DocumentPostingService.MAX_DOCUMENTS})')
+    chunk_size = request.args.get('chunk_size', type=int)
+    if chunk_size is not None and chunk_size < 1:
+        abort(400, 'Invalid chunk_size')
+    return jsonify(DocumentPostingService.post_receipts(data, chunk_size))
+
 # Обновить приходную накладную и её позиции
 @goods_receipt_api.route('/<int:receipt_id>', methods=['PUT'])
+@retry_on_stock_conflict
 def update_goods_receipt(receipt_id):
     r = GoodsReceipt.query.get_or_404(receipt_id)
+    old_date = r.date
+    old_lines = StockRepostService.snapshot_lines(r.items)
     data = request.get_json()
     if not data:
         abort(400, 'No input data')
@@ -152,16 +179,40 @@ def update_goods_receipt(receipt_id):
                 price=item.get('price')
             )
             db.session.add(receipt_item)
+        DocumentTotals.store('goods_receipt', [r.id])
+    if 'date' in data or 'items' in data:
+        # Перепроводим партии только по изменившимся товарам
+        stock_errors = StockRepostService.repost_receipt(old_date, old_lines, r)
+        if stock_errors:
+            db.session.rollback()
+            return jsonify({
+                'error': 'Insufficient stock',
+                'details': stock_errors
+            }), 400
+        StockCheckpointService.on_document_change(old_date, r.date)
     db.session.commit()
+    RenderCache.invalidate('goods_receipt', receipt_id)
     return jsonify({'result': 'success'})
 
 # Удалить приходную накладную и её позиции
 @goods_receipt_api.route('/<int:receipt_id>', methods=['DELETE'])
+@retry_on_stock_conflict
 def delete_goods_receipt(receipt_id):
     r = GoodsReceipt.query.get_or_404(receipt_id)
+    old_lines = StockRepostService.snapshot_lines(r.items)
     GoodsReceiptItem.query.filter_by(goods_receipt_id=r.id).delete()
     db.session.delete(r)
+    # Товар из партий этой накладной мог быть уже списан - тогда удаление запрещено
+    stock_errors = StockRepostService.repost_receipt(r.date, old_lines)
+    if stock_errors:
+        db.session.rollback()
+        return jsonify({
+            'error': 'Insufficient stock',
+            'details': stock_errors
+        }), 400
+    StockCheckpointService.on_document_change(r.date)
     db.session.commit()
+    RenderCache.invalidate('goods_receipt', receipt_id)
     return jsonify({'result': 'deleted'}) 
 
 PRINT_TEMPLATE_UA = """
@@ -170,7 +221,7 @@ PRINT_TEMPLATE_UA = """
 <head>
   <meta charset=\"utf-8\">
   <title>Прибуткова накладна №{{ receipt.number }}</title>
-  <style>
+  <style>{% block styles %}
     body { font-family: Arial, sans-serif; }
     table { border-collapse: collapse; width: 100%; margin-top: 20px; }
     th, td { border: 1px solid #333; padding: 6px 10px; text-align: left; }
@@ -179,9 +230,9 @@ PRINT_TEMPLATE_UA = """
     .footer { margin-top: 30px; }
     .supplier-info { margin-bottom: 15px; }
     .total-words { margin-top: 15px; font-weight: bold; }
-  </style>
+  {% endblock %}</style>
 </head>
-<body>
+<body>{% block content %}
   <div class=\"header\">
     <h2>Прибуткова накладна №{{ receipt.number }} від {{ receipt.date.strftime('%d.%m.%Y') }}</h2>
     <div class=\"supplier-info\">
@@ -259,29 +310,47 @@ PRINT_TEMPLATE_UA = """
     <div>Відповідальний: {{ receipt.responsible or '____________________' }}</div>
     <div>Підпис: ____________________</div>
   </div>
-</body>
+{% endblock %}</body>
 </html>
 """
 
+DocumentRenderer.register('goods_receipt.html', PRINT_TEMPLATE_UA)
+
+def goods_receipt_context(r, fmt='html'):
+    """Данные для шаблона приходной накладной"""
+    # Итоги хранятся в заголовке документа
+    totals = DocumentTotals.of_header(r)
+    context = dict(receipt=r, total=totals['total'], total_vat=totals['total_vat'], total_wo_vat=totals['total_wo_vat'])
+    if fmt == 'html':
+        context.update(number_to_words_ua=number_to_words_ua, total_words=number_to_words_ua(totals['total']))
+    return context
+
+def goods_receipt_version(r):
+    """Версия приходной накладной для кэша готовых форм"""
+    return RenderCache.fingerprint(r, r.supplier, r.items, [item.product for item in r.items])
+
+def render_goods_receipt(r, fmt):
+    """Печатная форма (fmt='html') или XML (fmt='xml') приходной накладной; готовый результат кэшируется"""
+    return RenderCache.get_or_render(
+        'goods_receipt', r.id, fmt, goods_receipt_version(r),
+        lambda: DocumentRenderer.render(f'goods_receipt.{fmt}', **goods_receipt_context(r, fmt))
+    )
+
 @goods_receipt_api.route('/<int:receipt_id>/print', methods=['GET'])
+@conditional('goods_receipt/{receipt_id}', 'customer', 'product')
 def print_goods_receipt(receipt_id):
-    r = GoodsReceipt.query.get_or_404(receipt_id)
-    # Считаем total
-    total = sum((item.price or 0) * (item.quantity or 0) for item in r.items)
-    vat_rate = 0.2
-    total_vat = total * vat_rate / (1 + vat_rate)
-    total_wo_vat = total - total_vat
-    total_words = number_to_words_ua(total)
-    html = render_template_string(
-        PRINT_TEMPLATE_UA,
-        receipt=r,
-        number_to_words_ua=number_to_words_ua,
-        total=total,
-        total_vat=total_vat,
-        total_wo_vat=total_wo_vat,
-        total_words=total_words
+    r = DocumentQueries.goods_receipts().get_or_404(receipt_id)
+    DocumentQueries.attach_references([r])
+    return render_goods_receipt(r, 'html')
+
+# Печать нескольких приходных накладных одним документом: ?ids=1,2,3 или ?date_from=&date_to=
+@goods_receipt_api.route('/print', methods=['GET'])
+@conditional('goods_receipt', 'customer', 'product')
+def print_goods_receipts():
+    return batch_print_response(
+        'goods_receipt', DocumentQueries.goods_receipts(), GoodsReceipt.date,
+        goods_receipt_context, goods_receipt_version, 'Прибуткові накладні'
     )
-    return html
 
 # В шаблоне:
 # - Всього: {{ '%.2f' % total }}
@@ -352,22 +421,11 @@ XML_TEMPLATE_RECEIPT_UA = """<?xml version="1.0" encoding="utf-8"?>
 </ЕлектроннийДокумент>
 """
 
+DocumentRenderer.register('goods_receipt.xml', XML_TEMPLATE_RECEIPT_UA)
+
 @goods_receipt_api.route('/<int:receipt_id>/xml', methods=['GET'])
+@conditional('goods_receipt/{receipt_id}', 'customer', 'product')
 def xml_goods_receipt(receipt_id):
-    r = GoodsReceipt.query.get_or_404(receipt_id)
-    # Считаем total
-    total = sum((item.price or 0) * (item.quantity or 0) for item in r.items)
-    vat_rate = 0.2
-    total_vat = total * vat_rate / (1 + vat_rate)
-    total_wo_vat = total - total_vat
-    
-    xml_content = render_template_string(
-        XML_TEMPLATE_RECEIPT_UA,
-        receipt=r,
-        total=total,
-        total_vat=total_vat,
-        total_wo_vat=total_wo_vat
-    )
-    
-    from flask import Response
-    return Response(xml_content, mimetype='application/xml') 
\ No newline at end of file
+    r = DocumentQueries.goods_receipts().get_or_404(receipt_id)
+    DocumentQueries.attach_references([r])
+    return Response(render_goods_receipt(r, 'xml'), mimetype='application/xml') 
\ No newline at end of file
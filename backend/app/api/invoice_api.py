@@ -1,38 +1,50 @@
-from flask import Blueprint, request, jsonify, abort, render_template_string
+from flask import Blueprint, request, jsonify, abort, Response
 from app.models.models import Invoice, Order
 from app.db import db
+from app.services.document_renderer import DocumentRenderer
+from app.services.render_cache import RenderCache
+from app.services.document_totals import DocumentTotals
+from app.api.collection import collection_response
+from app.api.batch_print import batch_print_response
+from app.services.document_queries import DocumentQueries
+from app.api.conditional import conditional
 from datetime import datetime
 from app.utils.number_to_words import number_to_words_ua
 
 invoice_api = Blueprint('invoice_api', __name__, url_prefix='/api/invoices')
 
-# Получить список всех счетов-фактур
+def serialize_invoice(inv):
+    return {
+        'id': inv.id,
+        'order_id': inv.order_id,
+        'order_status': inv.order.status if inv.order else None,
+        'date': inv.date.isoformat(),
+        'total': inv.total,
+        'total_vat': inv.total_vat,
+        'line_count': inv.line_count
+    }
+
+# Получить список счетов-фактур (фильтры, сортировка, пагинация - см. collection_response)
 @invoice_api.route('/', methods=['GET'])
+@conditional('invoice', 'order')
 def get_invoices():
-    invoices = Invoice.query.all()
-    return jsonify([
-        {
-            'id': inv.id,
-            'order_id': inv.order_id,
-            'order_status': inv.order.status if inv.order else None,
-            'date': inv.date.isoformat(),
-            'total': inv.total
-        } for inv in invoices
-    ])
+    return collection_response(
+        DocumentQueries.invoices(),
+        serialize_invoice,
+        sort_keys={'id': Invoice.id, 'date': Invoice.date, 'total': Invoice.total},
+        date_column=Invoice.date,
+        filters={'order_id': (Invoice.order_id, int)},
+        ranges={'total': Invoice.total}
+    )
 
 # Получить счет-фактуру по id
 @invoice_api.route('/<int:invoice_id>', methods=['GET'])
+@conditional('invoice/{invoice_id}', 'order')
 def get_invoice(invoice_id):
-    inv = Invoice.query.get_or_404(invoice_id)
-    return jsonify({
-        'id': inv.id,
-        'order_id': inv.order_id,
-        'order_status': inv.order.status if inv.order else None,
-        'date': inv.date.isoformat(),
-        'total': inv.total
-    })
+    inv = DocumentQueries.invoices().get_or_404(invoice_id)
+    return jsonify(serialize_invoice(inv))
 
-# Создать новый счет-фактуру
+# Создать новый счет-фактуру (сумма считается по позициям заказа)
 @invoice_api.route('/', methods=['POST'])
 def create_invoice():
     data = request.get_json()
@@ -44,10 +56,11 @@ def create_invoice():
         abort(400, 'Invalid date format')
     invoice = Invoice(
         order_id=data['order_id'],
-        date=invoice_date,
-        total=data.get('total')
+        date=invoice_date
     )
     db.session.add(invoice)
+    db.session.flush()
+    DocumentTotals.store('invoice', [invoice.id])
     db.session.commit()
     return jsonify({'id': invoice.id}), 201
 
@@ -60,14 +73,14 @@ def update_invoice(invoice_id):
         abort(400, 'No input data')
     if 'order_id' in data:
         inv.order_id = data['order_id']
+        DocumentTotals.store('invoice', [inv.id])
     if 'date' in data:
         try:
             inv.date = datetime.fromisoformat(data['date'])
         except Exception:
             abort(400, 'Invalid date format')
-    if 'total' in data:
-        inv.total = data['total']
     db.session.commit()
+    RenderCache.invalidate('invoice', invoice_id)
     return jsonify({'result': 'success'})
 
 # Удалить счет-фактуру
@@ -76,6 +89,7 @@ def delete_invoice(invoice_id):
     inv = Invoice.query.get_or_404(invoice_id)
     db.session.delete(inv)
     db.session.commit()
+    RenderCache.invalidate('invoice', invoice_id)
     return jsonify({'result': 'deleted'})
 
 PRINT_TEMPLATE_INVOICE_UA = """
@@ -84,7 +98,7 @@ PRINT_TEMPLATE_INVOICE_UA = """
 <head>
   <meta charset=\"utf-8\">
   <title>Рахунок-фактура №{{ invoice.id }}</title>
-  <style>
+  <style>{% block styles %}
     body { font-family: Arial, sans-serif; }
     table { border-collapse: collapse; width: 100%; margin-top: 20px; }
     th, td { border: 1px solid #333; padding: 6px 10px; text-align: left; }
@@ -93,9 +107,9 @@ PRINT_TEMPLATE_INVOICE_UA = """
     .footer { margin-top: 30px; }
     .customer-info { margin-bottom: 15px; }
     .total-words { margin-top: 15px; font-weight: bold; }
-  </style>
+  {% endblock %}</style>
 </head>
-<body>
+<body>{% block content %}
   <div class=\"header\">
     <h2>Рахунок-фактура №{{ invoice.id }} від {{ invoice.date.strftime('%d.%m.%Y') }}</h2>
     <div class=\"customer-info\">
@@ -152,29 +166,48 @@ PRINT_TEMPLATE_INVOICE_UA = """
     <div>Відповідальний: ____________________</div>
     <div>Підпис: ____________________</div>
   </div>
-</body>
+{% endblock %}</body>
 </html>
 """
 
+DocumentRenderer.register('invoice.html', PRINT_TEMPLATE_INVOICE_UA)
+
+def invoice_context(inv, fmt='html'):
+    """Данные для шаблона счёта-фактуры"""
+    # Итоги хранятся в заголовке документа
+    totals = DocumentTotals.of_header(inv)
+    context = dict(invoice=inv, total=totals['total'], total_vat=totals['total_vat'], total_wo_vat=totals['total_wo_vat'])
+    if fmt == 'html':
+        context.update(number_to_words_ua=number_to_words_ua, total_words=number_to_words_ua(totals['total']))
+    return context
+
+def invoice_version(inv):
+    """Версия счёта-фактуры для кэша готовых форм"""
+    order = inv.order
+    return RenderCache.fingerprint(inv, order, order.customer, order.items, [item.product for item in order.items])
+
+def render_invoice(inv, fmt):
+    """Печатная форма (fmt='html') или XML (fmt='xml') счёта-фактуры; готовый результат кэшируется"""
+    return RenderCache.get_or_render(
+        'invoice', inv.id, fmt, invoice_version(inv),
+        lambda: DocumentRenderer.render(f'invoice.{fmt}', **invoice_context(inv, fmt))
+    )
+
 @invoice_api.route('/<int:invoice_id>/print', methods=['GET'])
+@conditional('invoice/{invoice_id}', 'order', 'customer', 'product')
 def print_invoice(invoice_id):
-    inv = Invoice.query.get_or_404(invoice_id)
-    # Считаем total
-    total = sum((item.price or 0) * (item.quantity or 0) for item in inv.order.items)
-    vat_rate = 0.2
-    total_vat = total * vat_rate / (1 + vat_rate)
-    total_wo_vat = total - total_vat
-    total_words = number_to_words_ua(total)
-    html = render_template_string(
-        PRINT_TEMPLATE_INVOICE_UA,
-        invoice=inv,
-        number_to_words_ua=number_to_words_ua,
-        total=total,
-        total_vat=total_vat,
-        total_wo_vat=total_wo_vat,
-        total_words=total_words
+    inv = DocumentQueries.invoices(with_lines=True).get_or_404(invoice_id)
+    DocumentQueries.attach_references([inv])
+    return render_invoice(inv, 'html')
+
+# Печать нескольких счетов-фактур одним документом: ?ids=1,2,3 или ?date_from=&date_to=
+@invoice_api.route('/print', methods=['GET'])
+@conditional('invoice', 'order', 'customer', 'product')
+def print_invoices():
+    return batch_print_response(
+        'invoice', DocumentQueries.invoices(with_lines=True), Invoice.date,
+        invoice_context, invoice_version, 'Рахунки-фактури'
     )
-    return html 
 
 XML_TEMPLATE_INVOICE_UA = """<?xml version="1.0" encoding="utf-8"?>
 <ЕлектроннийДокумент>
@@ -240,22 +273,11 @@ XML_TEMPLATE_INVOICE_UA = """<?xml version="1.0" encoding="utf-8"?>
 </ЕлектроннийДокумент>
 """
 
+DocumentRenderer.register('invoice.xml', XML_TEMPLATE_INVOICE_UA)
+
 @invoice_api.route('/<int:invoice_id>/xml', methods=['GET'])
+@conditional('invoice/{invoice_id}', 'order', 'customer', 'product')
 def xml_invoice(invoice_id):
-    inv = Invoice.query.get_or_404(invoice_id)
-    # Считаем total
-    total = sum((item.price or 0) * (item.quantity or 0) for item in inv.order.items)
-    vat_rate = 0.2
-    total_vat = total * vat_rate / (1 + vat_rate)
-    total_wo_vat = total - total_vat
-    
-    xml_content = render_template_string(
-        XML_TEMPLATE_INVOICE_UA,
-        invoice=inv,
-        total=total,
-        total_vat=total_vat,
-        total_wo_vat=total_wo_vat
-    )
-    
-    from flask import Response
-    return Response(xml_content, mimetype='application/xml') 
\ No newline at end of file
+    inv = DocumentQueries.invoices(with_lines=True).get_or_404(invoice_id)
+    DocumentQueries.attach_references([inv])
+    return Response(render_invoice(inv, 'xml'), mimetype='application/xml') 
\ No newline at end of file
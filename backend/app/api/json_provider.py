@@ -0,0 +1,30 @@
+from flask.json.provider import DefaultJSONProvider
+try:
+    import orjson
+except ImportError:  # orjson не установлен - остаётся стандартный json
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON через orjson: списки документов и справочников сериализуются в разы быстрее.
+
+    Вывод совместим со стандартным провайдером Flask: ключи сортируются, даты,
+    Decimal и прочее преобразуются тем же default. Отличие - не-ASCII символы
+    пишутся в UTF-8 как есть, а не \\uXXXX (ответ короче). Значения, которые
+    orjson не поддерживает (целые больше 64 бит), сериализуются стандартным json.
+    """
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+def init_json(app):
+    """Подключает OrjsonProvider, если orjson установлен и не выбран JSON_PROVIDER = 'default'"""
+    if orjson is not None and app.config.get('JSON_PROVIDER', 'orjson') == 'orjson':
+        app.json = OrjsonProvider(app)
@@ -1,43 +1,25 @@
 from flask import Blueprint, request, jsonify, abort
-from app.models.models import Order, OrderItem, Customer, Product
+from app.models.models import Order, OrderItem, Customer, Product, GoodsIssue
 from app.db import db
+from app.api.collection import collection_response
+from app.services.document_queries import DocumentQueries
+from app.services.document_totals import DocumentTotals
+from app.services.reservation_service import ReservationService
+from app.api.conditional import conditional
 from datetime import datetime
 
 order_api = Blueprint('order_api', __name__, url_prefix='/api/orders')
 
-# Получить список всех заказов
-@order_api.route('/', methods=['GET'])
-def get_orders():
-    orders = Order.query.all()
-    return jsonify([
-        {
-            'id': o.id,
-            'date': o.date.isoformat(),
-            'customer_id': o.customer_id,
-            'customer_name': o.customer.name if o.customer else None,
-            'status': o.status,
-            'items': [
-                {
-                    'id': item.id,
-                    'product_id': item.product_id,
-                    'product_name': item.product.name if item.product else None,
-                    'quantity': item.quantity,
-                    'price': item.price
-                } for item in o.items
-            ]
-        } for o in orders
-    ])
-
-# Получить заказ по id
-@order_api.route('/<int:order_id>', methods=['GET'])
-def get_order(order_id):
-    order = Order.query.get_or_404(order_id)
-    return jsonify({
-        'id': order.id,
-        'date': order.date.isoformat(),
-        'customer_id': order.customer_id,
-        'customer_name': order.customer.name if order.customer else None,
-        'status': order.status,
+def serialize_order(o):
+    return {
+        'id': o.id,
+        'date': o.date.isoformat(),
+        'customer_id': o.customer_id,
+        'customer_name': o.customer.name if o.customer else None,
+        'status': o.status,
+        'total': o.total,
+        'total_vat': o.total_vat,
+        'line_count': o.line_count,
         'items': [
             {
                 'id': item.id,
@@ -45,9 +27,34 @@ def get_order(order_id):
                 'product_name': item.product.name if item.product else None,
                 'quantity': item.quantity,
                 'price': item.price
-            } for item in order.items
+            } for item in o.items
         ]
-    })
+    }
+
+# Получить список заказов (фильтры, сортировка, пагинация - см. collection_response)
+@order_api.route('/', methods=['GET'])
+@conditional('order', 'customer', 'product')
+def get_orders():
+    return collection_response(
+        DocumentQueries.orders(),
+        serialize_order,
+        sort_keys={'id': Order.id, 'date': Order.date, 'total': Order.total},
+        date_column=Order.date,
+        filters={
+            'customer_id': (Order.customer_id, int),
+            'status': (Order.status, str)
+        },
+        ranges={'total': Order.total},
+        prepare=DocumentQueries.attach_references
+    )
+
+# Получить заказ по id
+@order_api.route('/<int:order_id>', methods=['GET'])
+@conditional('order/{order_id}', 'customer', 'product')
+def get_order(order_id):
+    order = DocumentQueries.orders().get_or_404(order_id)
+    DocumentQueries.attach_references([order])
+    return jsonify(serialize_order(order))
 
 # Создать новый заказ с позициями
 @order_api.route('/', methods=['POST'])
@@ -76,6 +83,8 @@ def create_order():
             price=item.get('price')
         )
         db.session.add(order_item)
+    DocumentTotals.store('order', [order.id])
+    ReservationService.reserve_order(order)
     db.session.commit()
     return jsonify({'id': order.id}), 201
 
@@ -109,6 +118,12 @@ def update_order(order_id):
                 price=item.get('price')
             )
             db.session.add(order_item)
+        # Итоги заказа и счетов по нему
+        DocumentTotals.store_order(order.id)
+    # Резерв пересоздаётся при изменении позиций или статуса (закрытый заказ резерв снимает);
+    # отгруженное накладными с order_id этого заказа в резерв не входит
+    if 'items' in data or 'status' in data:
+        ReservationService.reserve_order(order)
     db.session.commit()
     return jsonify({'result': 'success'})
 
@@ -117,6 +132,9 @@ def update_order(order_id):
 def delete_order(order_id):
     order = Order.query.get_or_404(order_id)
     OrderItem.query.filter_by(order_id=order.id).delete()
+    ReservationService.release(order.id)
+    # Накладные остаются, но больше не ссылаются на заказ
+    GoodsIssue.query.filter_by(order_id=order.id).update({'order_id': None})
     db.session.delete(order)
     db.session.commit()
     return jsonify({'result': 'deleted'}) 
\ No newline at end of file
@@ -1,62 +1,86 @@
 from flask import Blueprint, request, jsonify, abort
 from app.models.models import Product
 from app.db import db
+from app.api.collection import collection_response
+from app.api.bulk_import import import_response
+from app.services.product_search_service import ProductSearchService
+from app.services.reference_cache import ReferenceCache
+from app.api.conditional import conditional
 
 product_api = Blueprint('product_api', __name__, url_prefix='/api/products')
 
-# Получить список всех товаров/услуг
+def serialize_product(p):
+    return {
+        'id': p.id,
+        'name': p.name,
+        'type': p.type,
+        'unit': p.unit,
+        'price': p.price,
+        'description': p.description,
+        'barcode': p.barcode,
+        'weight': p.weight,
+        'volume': p.volume,
+        'manufacturer': p.manufacturer,
+        'country': p.country,
+        'group': p.group,
+        'subgroup': p.subgroup,
+        'vat_rate': p.vat_rate,
+        'min_stock': p.min_stock,
+        'max_stock': p.max_stock,
+        'supplier': p.supplier,
+        'supplier_price': p.supplier_price,
+        'notes': p.notes
+    }
+
+def normalize_barcode(value, product_id=None):
+    """Штрихкод без пробелов по краям (пустой - None); занятый другим товаром - 409"""
+    barcode = str(value).strip() if value is not None else ''
+    if not barcode:
+        return None
+    duplicate = Product.query.filter(Product.barcode == barcode, Product.id != product_id).first()
+    if duplicate is not None:
+        abort(409, f'Barcode {barcode} is already used by product {duplicate.id}')
+    return barcode
+
+# Получить список товаров/услуг (фильтры, сортировка, пагинация - см. collection_response)
 @product_api.route('/', methods=['GET'])
+@conditional('product')
 def get_products():
-    products = Product.query.all()
-    return jsonify([
-        {
-            'id': p.id,
-            'name': p.name,
-            'type': p.type,
-            'unit': p.unit,
-            'price': p.price,
-            'description': p.description,
-            'barcode': p.barcode,
-            'weight': p.weight,
-            'volume': p.volume,
-            'manufacturer': p.manufacturer,
-            'country': p.country,
-            'group': p.group,
-            'subgroup': p.subgroup,
-            'vat_rate': p.vat_rate,
-            'min_stock': p.min_stock,
-            'max_stock': p.max_stock,
-            'supplier': p.supplier,
-            'supplier_price': p.supplier_price,
-            'notes': p.notes
-        } for p in products
-    ])
+    return collection_response(
+        Product.query,
+        serialize_product,
+        sort_keys={'id': Product.id, 'name': Product.name},
+        filters={
+            'type': (Product.type, str),
+            'group': (Product.group, str),
+            'subgroup': (Product.subgroup, str),
+            'manufacturer': (Product.manufacturer, str)
+        }
+    )
+
+# Массовая загрузка товаров из CSV/NDJSON (обновление по штрихкоду) - см. import_response
+@product_api.route('/import', methods=['POST'])
+def import_products():
+    return import_response('products')
+
+# Поиск товаров: штрихкод или слова названия/описания/производителя/группы
+# GET /api/products/search?q=<запрос>&limit=20 - лучшие совпадения первыми (см. ProductSearchService)
+@product_api.route('/search', methods=['GET'])
+@conditional('product')
+def search_products():
+    query = request.args.get('q', '').strip()
+    if not query:
+        abort(400, 'Missing required parameter: q')
+    limit = request.args.get('limit', ProductSearchService.DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, ProductSearchService.MAX_LIMIT))
+    return jsonify([serialize_product(p) for p in ProductSearchService.search(query, limit)])
 
 # Получить товар/услугу по id
 @product_api.route('/<int:product_id>', methods=['GET'])
+@conditional('product/{product_id}')
 def get_product(product_id):
     product = Product.query.get_or_404(product_id)
-    return jsonify({
-        'id': product.id,
-        'name': product.name,
-        'type': product.type,
-        'unit': product.unit,
-        'price': product.price,
-        'description': product.description,
-        'barcode': product.barcode,
-        'weight': product.weight,
-        'volume': product.volume,
-        'manufacturer': product.manufacturer,
-        'country': product.country,
-        'group': product.group,
-        'subgroup': product.subgroup,
-        'vat_rate': product.vat_rate,
-        'min_stock': product.min_stock,
-        'max_stock': product.max_stock,
-        'supplier': product.supplier,
-        'supplier_price': product.supplier_price,
-        'notes': product.notes
-    })
+    return jsonify(serialize_product(product))
 
 # Создать новый товар/услугу
 @product_api.route('/', methods=['POST'])
@@ -70,7 +94,7 @@ def create_product():
         unit=data.get('unit'),
         price=data.get('price'),
         description=data.get('description'),
-        barcode=data.get('barcode'),
+        barcode=normalize_barcode(data.get('barcode')),
         weight=data.get('weight'),
         volume=data.get('volume'),
         manufacturer=data.get('manufacturer'),
@@ -86,6 +110,7 @@ def create_product():
     )
     db.session.add(product)
     db.session.commit()
+    ReferenceCache.invalidate(Product, [product.id])
     return jsonify({'id': product.id}), 201
 
 # Обновить товар/услугу
@@ -100,7 +125,8 @@ def update_product(product_id):
     product.unit = data.get('unit', product.unit)
     product.price = data.get('price', product.price)
     product.description = data.get('description', product.description)
-    product.barcode = data.get('barcode', product.barcode)
+    if 'barcode' in data:
+        product.barcode = normalize_barcode(data['barcode'], product.id)
     product.weight = data.get('weight', product.weight)
     product.volume = data.get('volume', product.volume)
     product.manufacturer = data.get('manufacturer', product.manufacturer)
@@ -114,6 +140,7 @@ def update_product(product_id):
     product.supplier_price = data.get('supplier_price', product.supplier_price)
     product.notes = data.get('notes', product.notes)
     db.session.commit()
+    ReferenceCache.invalidate(Product, [product_id])
     return jsonify({'result': 'success'})
 
 # Удалить товар/услугу
@@ -122,4 +149,5 @@ def delete_product(product_id):
     product = Product.query.get_or_404(product_id)
     db.session.delete(product)
     db.session.commit()
+    ReferenceCache.invalidate(Product, [product_id])
     return jsonify({'result': 'deleted'}) 
\ No newline at end of file
@@ -0,0 +1,25 @@
+from flask import abort
+from app.db import db
+from app.services.fifo_service import FIFOService
+from sqlalchemy.exc import SQLAlchemyError
+import functools
+
+def retry_on_stock_conflict(view):
+    """Повторяет обработчик, если партии изменил параллельный запрос (см. FIFOService.is_conflict).
+
+    Перед повтором транзакция откатывается, поэтому обработчик заново читает остатки
+    и заново проверяет их достаточность. Если конфликт не разрешился за
+    FIFOService.CONFLICT_RETRIES попыток - 409.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        for attempt in range(FIFOService.CONFLICT_RETRIES):
+            try:
+                return view(*args, **kwargs)
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                if not FIFOService.is_conflict(e):
+                    raise
+            FIFOService.pause_before_retry(attempt)
+        abort(409, FIFOService.CONFLICT_MESSAGE)
+    return wrapper
@@ -1,38 +1,43 @@
-from flask import Blueprint, request, jsonify, render_template_string
+from flask import Blueprint, request, jsonify, abort
 from app.models.models import StockBatch, Product
 from app.services.fifo_service import FIFOService
+from app.db import db
+from app.services.document_renderer import DocumentRenderer
+from app.api.collection import collection_response, stream_json
+from app.api.conditional import conditional
 from datetime import datetime
 
 stock_api = Blueprint('stock_api', __name__, url_prefix='/api/stock')
 
-# Получить остатки всех товаров
+# Получить остатки всех товаров (или выбранных: ?product_ids=1,2,3)
+# available_to_promise = остаток - действующие резервы открытых заказов (не меньше нуля).
+# Отгрузка накладной с order_id уменьшает резерв заказа; накладная без order_id резерв не трогает
 @stock_api.route('/', methods=['GET'])
+@conditional('stock', 'product')
 def get_stock():
-    products = Product.query.filter_by(type='product').all()
-    stock_data = []
-    
-    for product in products:
-        available_quantity, batches = FIFOService.get_available_stock(product.id)
-        stock_data.append({
-            'product_id': product.id,
-            'product_name': product.name,
-            'available_quantity': available_quantity,
-            'unit': product.unit
-        })
-    
-    return jsonify(stock_data)
+    product_ids = request.args.get('product_ids')
+    if product_ids:
+        try:
+            product_ids = [int(pid) for pid in product_ids.split(',') if pid.strip()]
+        except ValueError:
+            abort(400, 'Invalid product_ids')
+    else:
+        product_ids = None
+    return stream_json(FIFOService.iter_stock_snapshot(product_ids))
 
 # Получить остатки конкретного товара
 @stock_api.route('/<int:product_id>', methods=['GET'])
+@conditional('stock/{product_id}', 'product/{product_id}')
 def get_product_stock(product_id):
-    available_quantity, batches = FIFOService.get_available_stock(product_id)
-    product = Product.query.get_or_404(product_id)
+    row = next(FIFOService.iter_stock_snapshot([product_id]), None)
+    if row is None:
+        abort(404)
+    batches = StockBatch.query.filter_by(product_id=product_id).filter(
+        StockBatch.quantity > 0
+    ).order_by(StockBatch.received_date.asc()).all()
     
     return jsonify({
-        'product_id': product_id,
-        'product_name': product.name,
-        'available_quantity': available_quantity,
-        'unit': product.unit,
+        **row,
         'batches': [
             {
                 'id': batch.id,
@@ -43,47 +48,62 @@ def get_product_stock(product_id):
         ]
     })
 
-# Получить все партии товара
+def serialize_batch(batch):
+    return {
+        'id': batch.id,
+        'product_id': batch.product_id,
+        'product_name': batch.product.name,
+        'quantity': batch.quantity,
+        'received_date': batch.received_date.isoformat(),
+        'cost': batch.cost
+    }
+
+# Получить все партии товара (фильтры, сортировка, пагинация - см. collection_response)
 @stock_api.route('/batches', methods=['GET'])
+@conditional('stock', 'product')
 def get_all_batches():
-    batches = StockBatch.query.join(Product).all()
-    return jsonify([
-        {
-            'id': batch.id,
-            'product_id': batch.product_id,
-            'product_name': batch.product.name,
-            'quantity': batch.quantity,
-            'received_date': batch.received_date.isoformat(),
-            'cost': batch.cost
-        } for batch in batches
-    ]) 
+    return collection_response(
+        StockBatch.query.join(Product).options(db.contains_eager(StockBatch.product)),
+        serialize_batch,
+        sort_keys={'id': StockBatch.id, 'received_date': StockBatch.received_date},
+        date_column=StockBatch.received_date,
+        filters={'product_id': (StockBatch.product_id, int)}
+    )
+
+# Себестоимость реализованных товаров по журналу списания партий
+# ?group_by=document|customer|month&date_from=&date_to=&customer_id=
+@stock_api.route('/cogs', methods=['GET'])
+def get_cogs():
+    group_by = request.args.get('group_by', 'document')
+    try:
+        date_from = datetime.fromisoformat(request.args['date_from']).date() if request.args.get('date_from') else None
+        date_to = datetime.fromisoformat(request.args['date_to']).date() if request.args.get('date_to') else None
+    except ValueError:
+        abort(400, 'Invalid date format')
+    customer_id = request.args.get('customer_id', type=int)
+    try:
+        query = FIFOService.cogs_query(group_by, date_from, date_to, customer_id)
+    except ValueError as e:
+        abort(400, str(e))
+    result = []
+    for row in query:
+        entry = row._asdict()
+        if 'date' in entry:
+            entry['date'] = entry['date'].isoformat()
+        result.append(entry)
+    return jsonify(result)
 
 # Отчёт по остаткам на складе на дату (FIFO)
 @stock_api.route('/report', methods=['GET'])
 def stock_report():
     date_str = request.args.get('date')
-    print(f"[DEBUG] /api/stock/report?date={date_str}")
     if not date_str:
-        print("[DEBUG] Нет даты!")
         return jsonify({'error': 'Необхідно вказати дату (параметр date)'}), 400
     try:
         report_date = datetime.fromisoformat(date_str)
     except Exception:
-        print("[DEBUG] Невірний формат дати!")
         return jsonify({'error': 'Невірний формат дати'}), 400
-    products = Product.query.filter_by(type='product').all()
-    print(f"[DEBUG] Найдено товаров: {len(products)}")
-    report = []
-    for product in products:
-        available_quantity, batches = FIFOService.get_available_stock_on_date(product.id, report_date)
-        print(f"[DEBUG] {product.name}: {available_quantity}")
-        report.append({
-            'product_id': product.id,
-            'product_name': product.name,
-            'available_quantity': available_quantity,
-            'unit': product.unit
-        })
-    print(f"[DEBUG] Итоговый отчет: {report}")
+    report = list(FIFOService.iter_stock_on_date(report_date))
     return jsonify(report) 
 
 PRINT_TEMPLATE_STOCK_REPORT_UA = """
@@ -133,29 +153,17 @@ PRINT_TEMPLATE_STOCK_REPORT_UA = """
 </html>
 """
 
+DocumentRenderer.register('stock_report.html', PRINT_TEMPLATE_STOCK_REPORT_UA)
+
 @stock_api.route('/report/print', methods=['GET'])
 def print_stock_report():
     date_str = request.args.get('date')
-    print(f"[DEBUG] /api/stock/report/print?date={date_str}")
     if not date_str:
-        print("[DEBUG] Нет даты!")
         return 'Необхідно вказати дату (параметр date)', 400
     try:
         report_date = datetime.fromisoformat(date_str)
     except Exception:
-        print("[DEBUG] Невірний формат дати!")
         return 'Невірний формат дати', 400
-    products = Product.query.filter_by(type='product').all()
-    print(f"[DEBUG] Найдено товаров: {len(products)}")
-    report = []
-    for product in products:
-        available_quantity, _ = FIFOService.get_available_stock_on_date(product.id, report_date)
-        print(f"[DEBUG] {product.name}: {available_quantity}")
-        report.append({
-            'product_name': product.name,
-            'available_quantity': available_quantity,
-            'unit': product.unit
-        })
-    print(f"[DEBUG] Итоговый отчет: {report}")
-    html = render_template_string(PRINT_TEMPLATE_STOCK_REPORT_UA, report=report, date=report_date.strftime('%d.%m.%Y'))
+    report = list(FIFOService.iter_stock_on_date(report_date))
+    html = DocumentRenderer.render('stock_report.html', report=report, date=report_date.strftime('%d.%m.%Y'))
     return html 
\ No newline at end of file
@@ -0,0 +1,74 @@
+import click
+from app.db import db
+from app.services.stock_repost_service import StockRepostService
+from app.services.stock_checkpoint_service import StockCheckpointService
+from app.services.document_totals import DocumentTotals
+from app.services.bulk_import_service import BulkImportService
+from app.services.reservation_service import ReservationService
+import os
+
+def register_commands(app):
+    # flask --app run rebuild-stock
+    @app.cli.command('rebuild-stock')
+    def rebuild_stock():
+        """Перестраивает stock_batch, журнал списаний и контрольные точки по документам"""
+        shortages = StockRepostService.rebuild_all()
+        periods = StockCheckpointService.rebuild()
+        db.session.commit()
+        click.echo(f'Stock rebuilt, checkpoints: {periods} period(s)')
+        for shortage in shortages:
+            click.echo(
+                f"  product {shortage['product_id']}: issued {shortage['required']}, "
+                f"received {shortage['available']}, not covered {shortage['shortage']}"
+            )
+
+    # flask --app run check-totals [--fix]
+    @app.cli.command('check-totals')
+    @click.option('--fix', is_flag=True, help='Записать пересчитанные итоги в документы')
+    def check_totals(fix):
+        """Сверяет итоги в заголовках документов с посчитанными по строкам"""
+        drifted = 0
+        for doc_type in DocumentTotals.HEADERS:
+            rows = DocumentTotals.drift(doc_type)
+            drifted += len(rows)
+            click.echo(f'{doc_type}: {len(rows)} document(s) with drift')
+            for doc_id, stored, computed in rows:
+                click.echo(
+                    f'  {doc_id}: stored total={stored[0]} vat={stored[1]} lines={stored[2]}, '
+                    f'computed total={computed[0]} vat={computed[1]} lines={computed[2]}'
+                )
+            if fix and rows:
+                DocumentTotals.store(doc_type, [doc_id for doc_id, _, _ in rows])
+        if fix and drifted:
+            db.session.commit()
+            click.echo(f'Fixed {drifted} document(s)')
+        elif drifted:
+            raise SystemExit(1)
+
+    # flask --app run import-data products catalog.csv
+    @app.cli.command('import-data')
+    @click.argument('kind', type=click.Choice(list(BulkImportService.KINDS)))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(BulkImportService.FORMATS),
+                  help='Формат файла (по умолчанию - по расширению)')
+    @click.option('--chunk-size', type=click.IntRange(min=1), default=BulkImportService.CHUNK_SIZE,
+                  show_default=True, help='Строк в одной транзакции')
+    def import_data(kind, path, fmt, chunk_size):
+        """Массовая загрузка товаров (по штрихкоду) или клиентов (по ЕДРПОУ) из CSV/NDJSON"""
+        if fmt is None:
+            extension = os.path.splitext(path)[1].lower()
+            fmt = 'ndjson' if extension in ('.ndjson', '.jsonl') else 'csv'
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            report = BulkImportService.import_rows(kind, BulkImportService.iter_rows(f, fmt), chunk_size)
+        click.echo(
+            f"Rows: {report['rows']}, inserted: {report['inserted']}, "
+            f"updated: {report['updated']}, errors: {report['error_count']}"
+        )
+        for error in report['errors']:
+            click.echo(f"  row {error['row']}: {error['error']}")
+
+    # flask --app run expire-reservations
+    @app.cli.command('expire-reservations')
+    def expire_reservations():
+        """Снимает просроченные резервы заказов (то же, что делает фоновый поток)"""
+        click.echo(f'Expired {ReservationService.expire()} reservation(s)')
@@ -0,0 +1,69 @@
+"""Версионные миграции схемы SQLite.
+
+Каждая миграция - модуль mNNNN_<описание>.py в этом пакете с функцией upgrade(conn).
+Применённые версии хранятся в таблице schema_version; миграции выполняются
+по возрастанию номера, каждая в своей транзакции. Новые таблицы создаёт
+db.create_all() перед миграциями, миграции меняют уже существующие таблицы.
+"""
+import importlib
+import pkgutil
+from datetime import datetime
+from app.db import db
+
+SCHEMA_VERSION_DDL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TEXT NOT NULL
+)
+"""
+
+def column_exists(conn, table, column):
+    rows = conn.exec_driver_sql(f'PRAGMA table_info("{table}")').fetchall()
+    return any(row[1] == column for row in rows)
+
+def column_type(conn, table, column):
+    """Объявленный тип колонки или None, если колонки нет"""
+    for row in conn.exec_driver_sql(f'PRAGMA table_info("{table}")').fetchall():
+        if row[1] == column:
+            return row[2]
+    return None
+
+def add_column(conn, table, column, ddl):
+    """ALTER TABLE ... ADD COLUMN, если колонки ещё нет"""
+    if not column_exists(conn, table, column):
+        conn.exec_driver_sql(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {ddl}')
+
+def discover():
+    """Список (версия, имя, модуль) всех миграций пакета по возрастанию версии"""
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        name = module_info.name
+        if not (name.startswith('m') and name[1:5].isdigit()):
+            continue
+        module = importlib.import_module(f'{__name__}.{name}')
+        migrations.append((int(name[1:5]), name, module))
+    return sorted(migrations, key=lambda migration: migration[0])
+
+def applied_versions(conn):
+    conn.exec_driver_sql(SCHEMA_VERSION_DDL)
+    return {row[0] for row in conn.exec_driver_sql('SELECT version FROM schema_version')}
+
+def upgrade(engine=None, target=None):
+    """Применяет недостающие миграции (до target включительно). Возвращает имена применённых"""
+    engine = engine or db.engine
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    applied = []
+    for version, name, module in discover():
+        if version in done or (target is not None and version > target):
+            continue
+        with engine.begin() as conn:
+            module.upgrade(conn)
+            conn.exec_driver_sql(
+                'INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)',
+                (version, name, datetime.utcnow().isoformat())
+            )
+        applied.append(name)
+    return applied
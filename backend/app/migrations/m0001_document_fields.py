@@ -0,0 +1,62 @@
+"""Доп. поля контрагентов, товаров и накладных (бывшие migrate_add_edrpou.py и migrate_add_fields_2024_06.py)"""
+from app.migrations import add_column
+
+COLUMNS = {
+    'customer': [
+        ('edrpou', 'TEXT'),
+        ('type', 'TEXT'),
+        ('email', 'TEXT'),
+        ('ipn', 'TEXT'),
+        ('bank_name', 'TEXT'),
+        ('bank_account', 'TEXT'),
+        ('mfo', 'TEXT'),
+        ('contact_person', 'TEXT'),
+        ('contact_phone', 'TEXT'),
+        ('contact_email', 'TEXT'),
+        ('discount', 'REAL'),
+        ('credit_limit', 'REAL'),
+        ('payment_terms', 'TEXT'),
+        ('notes', 'TEXT'),
+        ('country', 'TEXT'),
+        ('city', 'TEXT'),
+        ('postal_code', 'TEXT'),
+        ('website', 'TEXT'),
+        ('tax_system', 'TEXT'),
+        ('vat_payer', 'BOOLEAN'),
+        ('vat_certificate', 'TEXT'),
+    ],
+    'product': [
+        ('description', 'TEXT'),
+        ('barcode', 'TEXT'),
+        ('weight', 'REAL'),
+        ('volume', 'REAL'),
+        ('manufacturer', 'TEXT'),
+        ('country', 'TEXT'),
+        ('group', 'TEXT'),
+        ('subgroup', 'TEXT'),
+        ('vat_rate', 'INTEGER'),
+        ('min_stock', 'REAL'),
+        ('max_stock', 'REAL'),
+        ('supplier', 'TEXT'),
+        ('supplier_price', 'REAL'),
+        ('notes', 'TEXT'),
+    ],
+}
+
+DOCUMENT_COLUMNS = [
+    ('contract', 'TEXT'),
+    ('warehouse', 'TEXT'),
+    ('organization', 'TEXT'),
+    ('operation_type', 'TEXT'),
+    ('responsible', 'TEXT'),
+    ('comment', 'TEXT'),
+    ('pricing_note', 'TEXT'),
+]
+
+def upgrade(conn):
+    for table, columns in COLUMNS.items():
+        for column, ddl in columns:
+            add_column(conn, table, column, ddl)
+    for table in ('goods_receipt', 'goods_issue'):
+        for column, ddl in DOCUMENT_COLUMNS:
+            add_column(conn, table, column, ddl)
@@ -0,0 +1,8 @@
+"""Связь партии со строкой приходной накладной (для перепроведения остатков)"""
+from app.migrations import add_column
+
+def upgrade(conn):
+    add_column(conn, 'stock_batch', 'goods_receipt_item_id', 'INTEGER REFERENCES goods_receipt_item(id)')
+    conn.exec_driver_sql(
+        'CREATE INDEX IF NOT EXISTS ix_stock_batch_goods_receipt_item_id ON stock_batch (goods_receipt_item_id)'
+    )
@@ -0,0 +1,25 @@
+"""Индексы внешних ключей и дат для FIFO, отчётов и списков документов"""
+
+INDEXES = [
+    ('ix_stock_batch_fifo', 'stock_batch', 'product_id, received_date, id, quantity'),
+    ('ix_goods_receipt_date', 'goods_receipt', 'date, id'),
+    ('ix_goods_receipt_supplier', 'goods_receipt', 'supplier_id, date'),
+    ('ix_goods_receipt_item_receipt', 'goods_receipt_item', 'goods_receipt_id, product_id, quantity'),
+    ('ix_goods_receipt_item_product', 'goods_receipt_item', 'product_id, goods_receipt_id, quantity'),
+    ('ix_goods_issue_date', 'goods_issue', 'date, id'),
+    ('ix_goods_issue_customer', 'goods_issue', 'customer_id, date'),
+    ('ix_goods_issue_item_issue', 'goods_issue_item', 'goods_issue_id, product_id, quantity'),
+    ('ix_goods_issue_item_product', 'goods_issue_item', 'product_id, goods_issue_id, quantity'),
+    ('ix_order_date', 'order', 'date, id'),
+    ('ix_order_customer_id', 'order', 'customer_id'),
+    ('ix_order_item_order_id', 'order_item', 'order_id'),
+    ('ix_order_item_product_id', 'order_item', 'product_id'),
+    ('ix_invoice_order_id', 'invoice', 'order_id'),
+    ('ix_tax_invoice_goods_issue_id', 'tax_invoice', 'goods_issue_id'),
+]
+
+def upgrade(conn):
+    for name, table, columns in INDEXES:
+        conn.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({columns})')
+    # Статистика для планировщика запросов
+    conn.exec_driver_sql('ANALYZE')
@@ -0,0 +1,27 @@
+"""Денежные колонки в копейках: цены, суммы и себестоимость хранятся целыми числами (тип Money)"""
+from app.migrations import column_type
+
+MONEY_COLUMNS = [
+    ('customer', 'credit_limit'),
+    ('product', 'price'),
+    ('product', 'supplier_price'),
+    ('order_item', 'price'),
+    ('invoice', 'total'),
+    ('goods_receipt_item', 'price'),
+    ('goods_issue_item', 'price'),
+    ('stock_batch', 'cost'),
+    ('stock_allocation', 'cost'),
+]
+
+def upgrade(conn):
+    for table, column in MONEY_COLUMNS:
+        declared = column_type(conn, table, column)
+        # Колонки INTEGER созданы db.create_all() уже под Money - в них копейки.
+        # SQLite не меняет тип колонки, поэтому в старых REAL-колонках остаются
+        # значения вида 1250.0 - Money читает их так же, как целые
+        if declared is None or declared.upper() == 'INTEGER':
+            continue
+        conn.exec_driver_sql(
+            f'UPDATE "{table}" SET "{column}" = CAST(ROUND("{column}" * 100) AS INTEGER) '
+            f'WHERE "{column}" IS NOT NULL'
+        )
@@ -0,0 +1,30 @@
+"""Итоги документов в заголовках: total, total_vat (в копейках) и line_count"""
+from app.migrations import add_column
+
+# Таблица документа -> (таблица строк, условие связи строки с документом)
+DOCUMENTS = {
+    'order': ('order_item', 'order_item.order_id = "order".id'),
+    'invoice': ('order_item', 'order_item.order_id = invoice.order_id'),
+    'goods_receipt': ('goods_receipt_item', 'goods_receipt_item.goods_receipt_id = goods_receipt.id'),
+    'goods_issue': ('goods_issue_item', 'goods_issue_item.goods_issue_id = goods_issue.id'),
+}
+
+VAT_RATE = 20
+
+def upgrade(conn):
+    for table, (item_table, condition) in DOCUMENTS.items():
+        add_column(conn, table, 'total', 'INTEGER')
+        add_column(conn, table, 'total_vat', 'INTEGER')
+        add_column(conn, table, 'line_count', 'INTEGER')
+        if table != 'invoice':
+            conn.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS ix_{table}_total ON "{table}" (total, id)')
+        # Заполняем итоги по строкам (как DocumentTotals.totals_query)
+        conn.exec_driver_sql(f'''
+            UPDATE "{table}" SET
+                line_count = (SELECT COUNT(*) FROM {item_table} WHERE {condition}),
+                total = (SELECT COALESCE(SUM(ROUND(COALESCE({item_table}.price, 0) * {item_table}.quantity)), 0)
+                         FROM {item_table} WHERE {condition})
+        ''')
+        conn.exec_driver_sql(
+            f'UPDATE "{table}" SET total_vat = ROUND(total * {VAT_RATE} / {100.0 + VAT_RATE})'
+        )
@@ -0,0 +1,5 @@
+"""Индексы ключей массовой загрузки справочников: штрихкод товара и ЕДРПОУ клиента"""
+
+def upgrade(conn):
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_product_barcode ON product (barcode)')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_customer_edrpou ON customer (edrpou)')
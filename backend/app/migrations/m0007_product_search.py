@@ -0,0 +1,51 @@
+"""Уникальный штрихкод товара и полнотекстовый индекс FTS5 для поиска товаров"""
+from sqlalchemy.exc import OperationalError
+
+# Индексируемые колонки product (в том же порядке, что веса в ProductSearchService)
+FTS_COLUMNS = ('name', 'description', 'manufacturer', 'group', 'subgroup')
+
+def _columns(prefix=''):
+    return ', '.join(f'{prefix}"{column}"' for column in FTS_COLUMNS)
+
+FTS_DDL = [
+    # Внешнее содержимое: текст хранится только в product, индекс ссылается на product.id
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        {_columns()}, content='product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    # Словарь индекса - кандидаты для исправления опечаток
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts_vocab USING fts5vocab(product_fts, 'row')",
+    f"""CREATE TRIGGER IF NOT EXISTS product_fts_insert AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts (rowid, {_columns()}) VALUES (new.id, {_columns('new.')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_fts_delete AFTER DELETE ON product BEGIN
+        INSERT INTO product_fts (product_fts, rowid, {_columns()}) VALUES ('delete', old.id, {_columns('old.')});
+    END""",
+    # Изменение цен и прочих неиндексируемых полей индекс не трогает
+    f"""CREATE TRIGGER IF NOT EXISTS product_fts_update AFTER UPDATE OF {_columns()} ON product BEGIN
+        INSERT INTO product_fts (product_fts, rowid, {_columns()}) VALUES ('delete', old.id, {_columns('old.')});
+        INSERT INTO product_fts (rowid, {_columns()}) VALUES (new.id, {_columns('new.')});
+    END""",
+    "INSERT INTO product_fts (product_fts) VALUES ('rebuild')",
+]
+
+def upgrade(conn):
+    conn.exec_driver_sql("UPDATE product SET barcode = NULLIF(TRIM(barcode), '') WHERE barcode IS NOT NULL")
+    # Повторяющиеся штрихкоды остаются у товара с меньшим id, у остальных переносятся в примечание
+    conn.exec_driver_sql("""
+        UPDATE product
+        SET notes = COALESCE(notes || char(10), '') || 'Duplicate barcode: ' || barcode,
+            barcode = NULL
+        WHERE barcode IS NOT NULL
+          AND id > (SELECT MIN(p.id) FROM product p WHERE p.barcode = product.barcode)
+    """)
+    conn.exec_driver_sql('DROP INDEX IF EXISTS ix_product_barcode')
+    conn.exec_driver_sql('CREATE UNIQUE INDEX ix_product_barcode ON product (barcode)')
+    for ddl in FTS_DDL:
+        try:
+            conn.exec_driver_sql(ddl)
+        except OperationalError as e:
+            # SQLite собран без FTS5 - поиск работает через LIKE (см. ProductSearchService)
+            if 'fts5' not in str(e):
+                raise
+            return
@@ -0,0 +1,5 @@
+"""Версия партии для оптимистической блокировки при параллельных списаниях"""
+from app.migrations import add_column
+
+def upgrade(conn):
+    add_column(conn, 'stock_batch', 'version', 'INTEGER NOT NULL DEFAULT 1')
@@ -0,0 +1,39 @@
+"""Триггеры версий данных (data_version) для ETag/Last-Modified"""
+
+# Таблица -> (коллекция, колонка id записи коллекции)
+TRACKED = {
+    'product': ('product', 'id'),
+    'customer': ('customer', 'id'),
+    'order': ('order', 'id'),
+    'order_item': ('order', 'order_id'),
+    'invoice': ('invoice', 'id'),
+    'goods_receipt': ('goods_receipt', 'id'),
+    'goods_receipt_item': ('goods_receipt', 'goods_receipt_id'),
+    'goods_issue': ('goods_issue', 'id'),
+    'goods_issue_item': ('goods_issue', 'goods_issue_id'),
+    # Остатки - по товару
+    'stock_batch': ('stock', 'product_id'),
+    'stock_reservation': ('stock', 'product_id'),
+}
+
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+def _trigger(table, event, row):
+    collection, column = TRACKED[table]
+    return f"""CREATE TRIGGER IF NOT EXISTS data_version_{table}_{event.lower()} AFTER {event} ON "{table}" BEGIN
+        INSERT INTO data_version (name, version, changed_at)
+        VALUES ('{collection}', 1, {NOW}), ('{collection}/' || {row}."{column}", 1, {NOW})
+        ON CONFLICT (name) DO UPDATE SET version = version + 1, changed_at = excluded.changed_at;
+    END"""
+
+def upgrade(conn):
+    for table in TRACKED:
+        conn.exec_driver_sql(_trigger(table, 'INSERT', 'new'))
+        conn.exec_driver_sql(_trigger(table, 'UPDATE', 'new'))
+        conn.exec_driver_sql(_trigger(table, 'DELETE', 'old'))
+    # Коллекции получают отметку времени сразу, записи - при первом изменении
+    for collection in sorted({collection for collection, _ in TRACKED.values()}):
+        conn.exec_driver_sql(
+            f'INSERT OR IGNORE INTO data_version (name, version, changed_at) VALUES (?, 1, {NOW})',
+            (collection,)
+        )
@@ -0,0 +1,6 @@
+"""Ссылка расходной накладной на заказ: отгруженное по заказу уменьшает его резерв"""
+from app.migrations import add_column
+
+def upgrade(conn):
+    add_column(conn, 'goods_issue', 'order_id', 'INTEGER REFERENCES "order" (id)')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_goods_issue_order_id ON goods_issue (order_id)')
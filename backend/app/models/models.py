@@ -1,4 +1,5 @@
 from app.db import db
+from app.models.types import Money
 
 class Customer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -17,7 +18,7 @@ class Customer(db.Model):
     contact_phone = db.Column(db.String)
     contact_email = db.Column(db.String)
     discount = db.Column(db.Float)
-    credit_limit = db.Column(db.Float)
+    credit_limit = db.Column(Money)
     payment_terms = db.Column(db.String)
     notes = db.Column(db.String)
     country = db.Column(db.String)
@@ -30,13 +31,16 @@ class Customer(db.Model):
     orders = db.relationship('Order', backref='customer', lazy=True)
     goods_issues = db.relationship('GoodsIssue', backref='customer', lazy=True)
     goods_receipts = db.relationship('GoodsReceipt', backref='supplier', lazy=True)
+    __table_args__ = (
+        db.Index('ix_customer_edrpou', 'edrpou'),
+    )
 
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     type = db.Column(db.String, nullable=False)  # 'product' или 'service'
     unit = db.Column(db.String)
-    price = db.Column(db.Float)
+    price = db.Column(Money)
     # Новые поля:
     description = db.Column(db.String)
     barcode = db.Column(db.String)
@@ -50,33 +54,48 @@ class Product(db.Model):
     min_stock = db.Column(db.Float)
     max_stock = db.Column(db.Float)
     supplier = db.Column(db.String)
-    supplier_price = db.Column(db.Float)
+    supplier_price = db.Column(Money)
     notes = db.Column(db.String)
     order_items = db.relationship('OrderItem', backref='product', lazy=True)
     goods_receipt_items = db.relationship('GoodsReceiptItem', backref='product', lazy=True)
     goods_issue_items = db.relationship('GoodsIssueItem', backref='product', lazy=True)
     stock_batches = db.relationship('StockBatch', backref='product', lazy=True)
+    __table_args__ = (
+        # Штрихкод уникален (NULL допускается у нескольких товаров)
+        db.Index('ix_product_barcode', 'barcode', unique=True),
+    )
 
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
-    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False, index=True)
     status = db.Column(db.String)
+    # Итоги по строкам, пересчитываются при записи документа (DocumentTotals.store)
+    total = db.Column(Money)
+    total_vat = db.Column(Money)
+    line_count = db.Column(db.Integer)
     items = db.relationship('OrderItem', backref='order', lazy=True)
     invoice = db.relationship('Invoice', backref='order', uselist=False)
+    __table_args__ = (
+        db.Index('ix_order_date', 'date', 'id'),
+        db.Index('ix_order_total', 'total', 'id'),
+    )
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
     quantity = db.Column(db.Float, nullable=False)
-    price = db.Column(db.Float)
+    price = db.Column(Money)
 
 class Invoice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     date = db.Column(db.Date, nullable=False)
-    total = db.Column(db.Float)
+    # Итоги по строкам заказа, пересчитываются при записи (DocumentTotals.store)
+    total = db.Column(Money)
+    total_vat = db.Column(Money)
+    line_count = db.Column(db.Integer)
 
 class GoodsReceipt(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -90,20 +109,37 @@ class GoodsReceipt(db.Model):
     responsible = db.Column(db.String)
     comment = db.Column(db.String)
     pricing_note = db.Column(db.String)
+    # Итоги по строкам, пересчитываются при записи документа (DocumentTotals.store)
+    total = db.Column(Money)
+    total_vat = db.Column(Money)
+    line_count = db.Column(db.Integer)
     items = db.relationship('GoodsReceiptItem', backref='goods_receipt', lazy=True)
+    __table_args__ = (
+        db.Index('ix_goods_receipt_date', 'date', 'id'),
+        db.Index('ix_goods_receipt_supplier', 'supplier_id', 'date'),
+        db.Index('ix_goods_receipt_total', 'total', 'id'),
+    )
 
 class GoodsReceiptItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     goods_receipt_id = db.Column(db.Integer, db.ForeignKey('goods_receipt.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Float, nullable=False)
-    price = db.Column(db.Float)
+    price = db.Column(Money)
+    stock_batches = db.relationship('StockBatch', backref='goods_receipt_item', lazy=True)
+    __table_args__ = (
+        # Покрывающие индексы для отчётов: строки документа и движения товара
+        db.Index('ix_goods_receipt_item_receipt', 'goods_receipt_id', 'product_id', 'quantity'),
+        db.Index('ix_goods_receipt_item_product', 'product_id', 'goods_receipt_id', 'quantity'),
+    )
 
 class GoodsIssue(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
     number = db.Column(db.String)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'))
+    # Заказ, по которому отгружен товар: отгруженное уменьшает его резерв (ReservationService)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), index=True)
     contract = db.Column(db.String)
     warehouse = db.Column(db.String)
     organization = db.Column(db.String)
@@ -111,19 +147,33 @@ class GoodsIssue(db.Model):
     responsible = db.Column(db.String)
     comment = db.Column(db.String)
     pricing_note = db.Column(db.String)
+    # Итоги по строкам, пересчитываются при записи документа (DocumentTotals.store)
+    total = db.Column(Money)
+    total_vat = db.Column(Money)
+    line_count = db.Column(db.Integer)
     items = db.relationship('GoodsIssueItem', backref='goods_issue', lazy=True)
     tax_invoice = db.relationship('TaxInvoice', backref='goods_issue', uselist=False)
+    __table_args__ = (
+        db.Index('ix_goods_issue_date', 'date', 'id'),
+        db.Index('ix_goods_issue_customer', 'customer_id', 'date'),
+        db.Index('ix_goods_issue_total', 'total', 'id'),
+    )
 
 class GoodsIssueItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     goods_issue_id = db.Column(db.Integer, db.ForeignKey('goods_issue.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Float, nullable=False)
-    price = db.Column(db.Float)
+    price = db.Column(Money)
+    allocations = db.relationship('StockAllocation', backref='goods_issue_item', lazy=True)
+    __table_args__ = (
+        db.Index('ix_goods_issue_item_issue', 'goods_issue_id', 'product_id', 'quantity'),
+        db.Index('ix_goods_issue_item_product', 'product_id', 'goods_issue_id', 'quantity'),
+    )
 
 class TaxInvoice(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    goods_issue_id = db.Column(db.Integer, db.ForeignKey('goods_issue.id'), nullable=False)
+    goods_issue_id = db.Column(db.Integer, db.ForeignKey('goods_issue.id'), nullable=False, index=True)
     date = db.Column(db.Date, nullable=False)
     number = db.Column(db.String)
 
@@ -132,4 +182,55 @@ class StockBatch(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Float, nullable=False)
     received_date = db.Column(db.Date, nullable=False)
-    cost = db.Column(db.Float, nullable=False) 
\ No newline at end of file
+    cost = db.Column(Money, nullable=False)
+    goods_receipt_item_id = db.Column(db.Integer, db.ForeignKey('goods_receipt_item.id'), index=True)  # Строка прихода, создавшая партию
+    # Версия строки для оптимистической блокировки: UPDATE партии проверяет версию,
+    # и если партию успел изменить параллельный запрос, flush выбрасывает StaleDataError
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    allocations = db.relationship('StockAllocation', backref='stock_batch', lazy=True)
+    __table_args__ = (
+        # Порядок FIFO по товару; quantity в индексе покрывает сумму остатков
+        db.Index('ix_stock_batch_fifo', 'product_id', 'received_date', 'id', 'quantity'),
+    )
+    __mapper_args__ = {'version_id_col': version}
+
+# Резерв товара под открытый заказ до expires_at (ReservationService)
+class StockReservation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    quantity = db.Column(db.Float, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (
+        # Сумма действующих резервов по товару; quantity в индексе покрывает сумму
+        db.Index('ix_stock_reservation_product', 'product_id', 'expires_at', 'quantity'),
+        # Просроченные резервы для очистки - диапазон по индексу, без просмотра таблицы
+        db.Index('ix_stock_reservation_expires', 'expires_at', 'id'),
+    )
+
+# Списание партий по строкам расходных накладных (журнал FIFO)
+class StockAllocation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    goods_issue_item_id = db.Column(db.Integer, db.ForeignKey('goods_issue_item.id'), nullable=False, index=True)
+    stock_batch_id = db.Column(db.Integer, db.ForeignKey('stock_batch.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    quantity = db.Column(db.Float, nullable=False)
+    cost = db.Column(Money, nullable=False)  # Себестоимость единицы из партии
+
+# Остатки товаров на конец месяца (контрольные точки для отчётов на дату)
+class StockCheckpoint(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    period_end = db.Column(db.Date, nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    quantity = db.Column(db.Float, nullable=False)
+    __table_args__ = (
+        db.UniqueConstraint('period_end', 'product_id', name='uq_stock_checkpoint_period_product'),
+    )
+
+# Версии данных для условных запросов HTTP (ETag/Last-Modified).
+# Строки пишут триггеры (миграция m0009) при любом изменении отслеживаемых таблиц:
+# name - коллекция ('product') или запись ('goods_issue/15')
+class DataVersion(db.Model):
+    name = db.Column(db.String, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    changed_at = db.Column(db.String, nullable=False)  # UTC, 'YYYY-MM-DD HH:MM:SS.SSS'
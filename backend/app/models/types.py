@@ -0,0 +1,20 @@
+from app.db import db
+from app.utils.money import to_minor_units, from_minor_units
+
+class Money(db.TypeDecorator):
+    """Денежная сумма: в БД хранится целым числом копеек, в Python - float с точностью до копейки.
+
+    В SQL-выражениях колонка содержит копейки; чтобы получить гривны из агрегата,
+    оберните его в db.type_coerce(выражение, Money).
+    """
+    impl = db.Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_minor_units(value)
+
+    def process_literal_param(self, value, dialect):
+        return 'NULL' if value is None else str(to_minor_units(value))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else from_minor_units(value)
@@ -0,0 +1,215 @@
+from app.models.models import Product, Customer
+from app.models.types import Money
+from app.services.reference_cache import ReferenceCache
+from app.db import db
+from sqlalchemy.exc import SQLAlchemyError
+import csv
+import itertools
+import json
+
+class BulkImportService:
+    """Массовая загрузка справочников (товары, клиенты) из CSV или NDJSON.
+
+    Строки читаются потоком и обрабатываются порциями по CHUNK_SIZE: порция
+    проверяется, существующие записи находятся одним запросом по ключу
+    (штрихкод товара, ЕДРПОУ клиента), новые добавляются одним INSERT,
+    найденные обновляются одним UPDATE (executemany), каждая порция - своя транзакция.
+    Для найденной записи достаточно ключа и изменяемых полей (частичное обновление),
+    обязательные поля проверяются только у новых; пустое обязательное поле
+    в обновлении оставляет значение в базе.
+    Ошибочные строки пропускаются и попадают в отчёт с номером строки.
+    """
+
+    CHUNK_SIZE = 1000
+
+    # Сколько ошибок возвращать в отчёте (всего ошибок - error_count)
+    MAX_REPORTED_ERRORS = 1000
+
+    # Тип справочника -> (модель, ключ для обновления, обязательные поля)
+    KINDS = {
+        'products': (Product, 'barcode', ('name', 'type')),
+        'customers': (Customer, 'edrpou', ('name',)),
+    }
+
+    FORMATS = ('csv', 'ndjson')
+
+    TRUE_VALUES = {'1', 'true', 'yes', 'y', 'так', 'да', '+'}
+    FALSE_VALUES = {'0', 'false', 'no', 'n', 'ні', 'нет', '-'}
+
+    @staticmethod
+    def iter_rows(stream, fmt):
+        """Строки файла как (номер строки, dict или None, ошибка); номера с 1 без заголовка CSV"""
+        if fmt == 'csv':
+            header = stream.readline()
+            try:
+                dialect = csv.Sniffer().sniff(header, delimiters=',;\t')
+            except csv.Error:
+                dialect = csv.excel
+            reader = csv.DictReader(itertools.chain([header], stream), dialect=dialect)
+            for number, row in enumerate(reader, 1):
+                yield number, {key.strip(): value for key, value in row.items() if key}, None
+        elif fmt == 'ndjson':
+            number = 0
+            for line in stream:
+                if not line.strip():
+                    continue
+                number += 1
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield number, None, f'Invalid JSON: {e}'
+                    continue
+                if not isinstance(row, dict):
+                    yield number, None, 'Row must be a JSON object'
+                    continue
+                yield number, row, None
+        else:
+            raise ValueError(f'Unknown import format: {fmt}')
+
+    @staticmethod
+    def _convert(column, value):
+        """Значение из файла в тип колонки; пустая строка - NULL"""
+        if isinstance(value, str):
+            value = value.strip()
+            if value == '':
+                return None
+        if value is None:
+            return None
+        column_type = column.type
+        if isinstance(value, str) and isinstance(column_type, (Money, db.Float, db.Integer)):
+            # В выгрузках из таблиц дробная часть часто отделяется запятой
+            value = float(value.replace(',', '.'))
+        if isinstance(column_type, (Money, db.Float)):
+            return float(value)
+        if isinstance(column_type, db.Boolean):
+            if isinstance(value, bool):
+                return value
+            text = str(value).lower()
+            if text in BulkImportService.TRUE_VALUES:
+                return True
+            if text in BulkImportService.FALSE_VALUES:
+                return False
+            raise ValueError(value)
+        if isinstance(column_type, db.Integer):
+            if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+                raise ValueError(value)
+            return int(value)
+        return str(value)
+
+    @staticmethod
+    def validate(kind, row):
+        """Значения колонок модели из строки файла. Неизвестные поля и id игнорируются.
+
+        Обязательные поля здесь не проверяются: строка, чей ключ уже есть в базе,
+        может содержать только изменяемые поля (см. missing_required).
+        Возвращает (values, None) или (None, ошибка).
+        """
+        model, _, _ = BulkImportService.KINDS[kind]
+        columns = model.__table__.columns
+        values = {}
+        for field, raw in row.items():
+            if field == 'id' or field not in columns:
+                continue
+            try:
+                values[field] = BulkImportService._convert(columns[field], raw)
+            except (TypeError, ValueError):
+                return None, f'Invalid value for {field}: {raw!r}'
+        return values, None
+
+    @staticmethod
+    def missing_required(kind, values):
+        """Ошибка, если новой записи не хватает обязательных полей, иначе None"""
+        _, _, required = BulkImportService.KINDS[kind]
+        missing = [field for field in required if values.get(field) is None]
+        if missing:
+            return f"Missing required fields: {', '.join(missing)}"
+        return None
+
+    @staticmethod
+    def _import_chunk(kind, chunk, report):
+        model, key, required = BulkImportService.KINDS[kind]
+        key_column = getattr(model, key)
+        rows = []
+        for number, row, error in chunk:
+            if error is None:
+                values, error = BulkImportService.validate(kind, row)
+            if error is not None:
+                BulkImportService._add_error(report, number, error)
+                continue
+            rows.append((number, values))
+
+        keys = {values[key] for _, values in rows if values.get(key) is not None}
+        existing = {}
+        if keys:
+            # Если в базе несколько записей с одним ключом, обновляется первая
+            existing = dict(
+                db.session.query(key_column, db.func.min(model.id))
+                .filter(key_column.in_(list(keys)))
+                .group_by(key_column)
+            )
+        # Строки с одним ключом в порции объединяются, поля более поздней строки побеждают
+        keyed = {}  # значение ключа -> (номер последней строки, values)
+        keyless = []
+        for number, values in rows:
+            key_value = values.get(key)
+            if key_value in existing:
+                # Пустое обязательное поле в обновлении (пустая ячейка CSV) - поле не меняется
+                values = {field: value for field, value in values.items() if value is not None or field not in required}
+            if key_value is None:
+                keyless.append((number, values))
+            else:
+                previous = keyed.get(key_value)
+                keyed[key_value] = (number, dict(previous[1], **values) if previous else values)
+
+        inserts = []
+        updates = []
+        numbers = []
+        for number, values in keyless + list(keyed.values()):
+            key_value = values.get(key)
+            if key_value in existing:
+                updates.append(dict(values, id=existing[key_value]))
+            else:
+                error = BulkImportService.missing_required(kind, values)
+                if error is not None:
+                    BulkImportService._add_error(report, number, error)
+                    continue
+                inserts.append(values)
+            numbers.append(number)
+        try:
+            if inserts:
+                db.session.execute(db.insert(model), inserts)
+            if updates:
+                db.session.execute(db.update(model), updates)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            for number in numbers:
+                BulkImportService._add_error(report, number, f"Chunk rejected by database: {getattr(e, 'orig', None) or e}")
+            return
+        ReferenceCache.invalidate(model, [values['id'] for values in updates])
+        report['inserted'] += len(inserts)
+        report['updated'] += len(updates)
+
+    @staticmethod
+    def _add_error(report, number, error):
+        report['error_count'] += 1
+        if len(report['errors']) < BulkImportService.MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': number, 'error': error})
+
+    @staticmethod
+    def import_rows(kind, rows, chunk_size=None):
+        """Загружает строки iter_rows порциями. Возвращает отчёт
+        {rows, inserted, updated, error_count, errors: [{row, error}]}
+        """
+        if kind not in BulkImportService.KINDS:
+            raise ValueError(f'Unknown import kind: {kind}')
+        chunk_size = chunk_size or BulkImportService.CHUNK_SIZE
+        report = {'rows': 0, 'inserted': 0, 'updated': 0, 'error_count': 0, 'errors': []}
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            report['rows'] += len(chunk)
+            BulkImportService._import_chunk(kind, chunk, report)
+        return report
@@ -0,0 +1,45 @@
+from app.models.models import DataVersion
+from app.services.render_cache import RenderCache
+from datetime import datetime, timezone
+import hashlib
+
+class DataVersionService:
+    """Версии данных для условных запросов HTTP.
+
+    Версии коллекций ('product', 'goods_issue', 'stock') и отдельных записей
+    ('goods_issue/15', 'stock/3') увеличивают триггеры БД (миграция m0009)
+    при любой записи в таблицы, поэтому они общие для всех процессов.
+    Запись без собственной версии ещё не менялась после миграции - для неё
+    берётся время изменения её коллекции.
+    """
+
+    @staticmethod
+    def _parse_time(value):
+        return datetime.fromisoformat(value).replace(microsecond=0, tzinfo=timezone.utc)
+
+    @staticmethod
+    def stamp(names, *variant):
+        """(etag, last_modified) для набора версий names одним запросом.
+
+        variant - то, от чего ещё зависит ответ (строка запроса, формат), попадает в etag.
+        Если у какой-либо коллекции нет строки версии (база без миграции m0009 или
+        таблица без триггера), изменения не отслеживаются - возвращается (None, None).
+        """
+        collections = {name.split('/', 1)[0] for name in names}
+        rows = {
+            row.name: row for row in
+            DataVersion.query.filter(DataVersion.name.in_(set(names) | collections))
+        }
+        if not collections <= rows.keys():
+            return None, None
+        # После изменения шаблонов или расчёта итогов печатные формы должны отдаваться заново
+        parts = [RenderCache.code_version(), *variant]
+        last_modified = None
+        for name in names:
+            row = rows.get(name) or rows[name.split('/', 1)[0]]
+            version = rows[name].version if name in rows else 0
+            parts.append(f"{name}:{version}:{row.changed_at}")
+            changed_at = DataVersionService._parse_time(row.changed_at)
+            last_modified = changed_at if last_modified is None else max(last_modified, changed_at)
+        etag = hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()[:32]
+        return etag, last_modified
@@ -0,0 +1,231 @@
+from app.models.models import (
+    GoodsReceipt, GoodsReceiptItem, GoodsIssue, GoodsIssueItem, Product, Order, StockBatch, StockAllocation
+)
+from app.services.fifo_service import FIFOService
+from app.services.reservation_service import ReservationService
+from app.services.stock_checkpoint_service import StockCheckpointService
+from app.services.document_totals import DocumentTotals
+from app.db import db
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime
+
+class DocumentPostingService:
+    """Пакетное проведение приходных и расходных накладных.
+
+    Документы обрабатываются порциями по CHUNK_SIZE, каждая порция - одна транзакция:
+    все документы порции проверяются заранее (поля, товары, остатки по партиям,
+    загруженным одним запросом на порцию), затем заголовки, строки, партии и журнал
+    списаний вставляются многострочными INSERT (по одному на таблицу), итоги
+    и контрольные точки пересчитываются один раз на порцию.
+    Ошибочный документ не проводится и не мешает остальным.
+    Результат по каждому документу: {'index', 'id'} или {'index', 'error'[, 'details']}.
+    """
+
+    CHUNK_SIZE = 100
+
+    # Максимальное количество документов в одном запросе
+    MAX_DOCUMENTS = 1000
+
+    HEADER_FIELDS = (
+        'number', 'contract', 'warehouse', 'organization', 'operation_type',
+        'responsible', 'comment', 'pricing_note'
+    )
+
+    # Расходная накладная может ссылаться на заказ (уменьшает его резерв)
+    ISSUE_FIELDS = HEADER_FIELDS + ('order_id',)
+
+    @staticmethod
+    def parse(data, partner_field, fields=HEADER_FIELDS):
+        """Поля заголовка и строки документа из JSON. Возвращает (header, lines, None) или (None, None, ошибка)"""
+        if not isinstance(data, dict):
+            return None, None, 'Document must be a JSON object'
+        if not data.get('date') or not data.get('items'):
+            return None, None, 'Missing required fields: date, items'
+        try:
+            document_date = datetime.fromisoformat(data['date'])
+        except (TypeError, ValueError):
+            return None, None, 'Invalid date format'
+        lines = []
+        for item in data['items']:
+            if not isinstance(item, dict) or not item.get('product_id') or not item.get('quantity'):
+                return None, None, 'Each item must have product_id and quantity'
+            lines.append({
+                'product_id': item['product_id'],
+                'quantity': item['quantity'],
+                'price': item.get('price')
+            })
+        header = {field: data.get(field) for field in fields}
+        header['date'] = document_date
+        header[partner_field] = data.get(partner_field)
+        return header, lines, None
+
+    @staticmethod
+    def _parse_chunk(chunk, partner_field, results, fields=HEADER_FIELDS):
+        """Разбирает документы порции и отсеивает ссылки на несуществующие товары и заказы
+        (по запросу на порцию)"""
+        parsed = []
+        for index, data in chunk:
+            header, lines, error = DocumentPostingService.parse(data, partner_field, fields)
+            if error:
+                results[index] = {'index': index, 'error': error}
+            else:
+                parsed.append((index, header, lines))
+        product_ids = {line['product_id'] for _, _, lines in parsed for line in lines}
+        known = {
+            product_id for product_id, in
+            db.session.query(Product.id).filter(Product.id.in_(product_ids))
+        } if product_ids else set()
+        order_ids = {header['order_id'] for _, header, _ in parsed if header.get('order_id') is not None}
+        known_orders = {
+            order_id for order_id, in
+            db.session.query(Order.id).filter(Order.id.in_(order_ids))
+        } if order_ids else set()
+        valid = []
+        for index, header, lines in parsed:
+            unknown = sorted({line['product_id'] for line in lines} - known, key=str)
+            if unknown:
+                results[index] = {'index': index, 'error': f"Unknown products: {', '.join(map(str, unknown))}"}
+            elif header.get('order_id') is not None and header['order_id'] not in known_orders:
+                results[index] = {'index': index, 'error': f"Unknown order: {header['order_id']}"}
+            else:
+                valid.append((index, header, lines))
+        return valid
+
+    @staticmethod
+    def insert_returning_ids(model, rows):
+        """Вставляет строки INSERT ... RETURNING id, возвращает id в порядке rows.
+
+        Порядок RETURNING базой не гарантируется: sort_by_parameter_order
+        сопоставляет id с параметрами. На SQLite (нет столбца-сентинела) SQLAlchemy
+        при этом выполняет INSERT по строке через executemany в той же транзакции.
+        """
+        if not rows:
+            return []
+        result = db.session.execute(db.insert(model).returning(model.id, sort_by_parameter_order=True), rows)
+        return [row_id for row_id, in result]
+
+    @staticmethod
+    def _insert_documents(model, item_model, document_key, documents):
+        """Заголовки и строки документов [(header, lines)]; проставляет id строкам. Возвращает id заголовков"""
+        header_ids = DocumentPostingService.insert_returning_ids(model, [header for header, _ in documents])
+        item_rows = [
+            dict(line, **{document_key: header_id})
+            for header_id, (_, lines) in zip(header_ids, documents) for line in lines
+        ]
+        item_ids = iter(DocumentPostingService.insert_returning_ids(item_model, item_rows))
+        for _, lines in documents:
+            for line in lines:
+                line['id'] = next(item_ids)
+        return header_ids
+
+    @staticmethod
+    def _post_receipt_chunk(chunk, results):
+        valid = DocumentPostingService._parse_chunk(chunk, 'supplier_id', results)
+        documents = [(header, lines) for _, header, lines in valid]
+        header_ids = DocumentPostingService._insert_documents(
+            GoodsReceipt, GoodsReceiptItem, 'goods_receipt_id', documents
+        )
+        # Партии по строкам - как FIFOService.batch_from_receipt_item
+        batches = [
+            {
+                'product_id': line['product_id'],
+                'quantity': line['quantity'],
+                'received_date': header['date'],
+                'cost': line['price'] or 0,
+                'goods_receipt_item_id': line['id']
+            } for header, lines in documents for line in lines
+        ]
+        if batches:
+            db.session.execute(db.insert(StockBatch), batches)
+        return 'goods_receipt', [
+            (index, header_id, header['date']) for (index, header, _), header_id in zip(valid, header_ids)
+        ]
+
+    @staticmethod
+    def _post_issue_chunk(chunk, results):
+        valid = DocumentPostingService._parse_chunk(
+            chunk, 'customer_id', results, DocumentPostingService.ISSUE_FIELDS
+        )
+        # Партии всех товаров порции - одним запросом; документы списывают их по очереди
+        open_batches = FIFOService.load_open_batches(
+            line['product_id'] for _, _, lines in valid for line in lines
+        )
+        accepted = []
+        allocations = []
+        for index, header, lines in valid:
+            # Строки для расчёта FIFO; в сессию не добавляются, вставляются вместе с остальными
+            items = [GoodsIssueItem(**line) for line in lines]
+            stock_errors = FIFOService.check_stock(items, open_batches)
+            if stock_errors:
+                results[index] = {'index': index, 'error': 'Insufficient stock', 'details': stock_errors}
+                continue
+            allocations.extend(FIFOService.allocate(items, open_batches))
+            accepted.append((index, header, lines, items))
+        header_ids = DocumentPostingService._insert_documents(
+            GoodsIssue, GoodsIssueItem, 'goods_issue_id', [(header, lines) for _, header, lines, _ in accepted]
+        )
+        for _, _, lines, items in accepted:
+            for line, item in zip(lines, items):
+                item.id = line['id']
+        if allocations:
+            db.session.execute(db.insert(StockAllocation), [
+                {
+                    'goods_issue_item_id': item.id,
+                    'stock_batch_id': batch.id,
+                    'product_id': item.product_id,
+                    'quantity': taken,
+                    'cost': batch.cost
+                } for item, batch, taken in allocations
+            ])
+        # Отгруженное по заказам уменьшает их резервы
+        ReservationService.refresh_orders(header['order_id'] for _, header, _, _ in accepted)
+        # Уменьшенные остатки партий (open_batches) запишутся при flush
+        return 'goods_issue', [
+            (index, header_id, header['date']) for (index, header, _, _), header_id in zip(accepted, header_ids)
+        ]
+
+    @staticmethod
+    def _post(documents, post_chunk, chunk_size=None):
+        chunk_size = chunk_size or DocumentPostingService.CHUNK_SIZE
+        documents = list(enumerate(documents))
+        results = {}
+        for start in range(0, len(documents), chunk_size):
+            chunk = documents[start:start + chunk_size]
+            for attempt in range(FIFOService.CONFLICT_RETRIES):
+                chunk_results = {}
+                try:
+                    doc_type, posted = post_chunk(chunk, chunk_results)
+                    DocumentTotals.store(doc_type, [document_id for _, document_id, _ in posted])
+                    StockCheckpointService.on_document_change(*[document_date for _, _, document_date in posted])
+                    db.session.commit()
+                except SQLAlchemyError as e:
+                    db.session.rollback()
+                    # Партии изменил параллельный запрос - порция проверяется и записывается заново
+                    if FIFOService.is_conflict(e):
+                        if attempt < FIFOService.CONFLICT_RETRIES - 1:
+                            FIFOService.pause_before_retry(attempt)
+                            continue
+                        error = FIFOService.CONFLICT_MESSAGE
+                    else:
+                        error = f"Chunk rejected by database: {getattr(e, 'orig', None) or e}"
+                    chunk_results.update(
+                        (index, {'index': index, 'error': error}) for index, _ in chunk if index not in chunk_results
+                    )
+                    posted = []
+                for index, document_id, _ in posted:
+                    chunk_results[index] = {'index': index, 'id': document_id}
+                results.update(chunk_results)
+                break
+        ordered = [results[index] for index in range(len(documents))]
+        failed = sum(1 for result in ordered if 'error' in result)
+        return {'posted': len(ordered) - failed, 'failed': failed, 'results': ordered}
+
+    @staticmethod
+    def post_receipts(documents, chunk_size=None):
+        """Проводит список приходных накладных (формат тела POST /api/goods_receipts/)"""
+        return DocumentPostingService._post(documents, DocumentPostingService._post_receipt_chunk, chunk_size)
+
+    @staticmethod
+    def post_issues(documents, chunk_size=None):
+        """Проводит список расходных накладных по FIFO (формат тела POST /api/goods_issues/)"""
+        return DocumentPostingService._post(documents, DocumentPostingService._post_issue_chunk, chunk_size)
@@ -0,0 +1,66 @@
+from app.models.models import (
+    Order, Invoice, GoodsReceipt, GoodsIssue, Product, Customer
+)
+from app.services.reference_cache import ReferenceCache
+from app.db import db
+from sqlalchemy.orm.attributes import set_committed_value
+
+class DocumentQueries:
+    """Запросы документов с жадной загрузкой связей.
+
+    Строки документов загружаются отдельным SELECT ... IN по всем документам
+    выборки, поэтому число запросов не зависит от количества документов.
+    Контрагенты и товары в запросы не входят: после загрузки их подставляет
+    attach_references из ReferenceCache (справочники меняются редко).
+    """
+
+    # Документ -> (колонка ссылки на контрагента, связь с ним)
+    COUNTERPARTIES = {
+        Order: ('customer_id', 'customer'),
+        GoodsReceipt: ('supplier_id', 'supplier'),
+        GoodsIssue: ('customer_id', 'customer'),
+    }
+
+    @staticmethod
+    def orders():
+        return Order.query.options(db.selectinload(Order.items))
+
+    @staticmethod
+    def invoices(with_lines=False):
+        if not with_lines:
+            return Invoice.query.options(db.joinedload(Invoice.order))
+        return Invoice.query.options(db.joinedload(Invoice.order).selectinload(Order.items))
+
+    @staticmethod
+    def goods_receipts():
+        return GoodsReceipt.query.options(db.selectinload(GoodsReceipt.items))
+
+    @staticmethod
+    def goods_issues():
+        return GoodsIssue.query.options(db.selectinload(GoodsIssue.items))
+
+    @staticmethod
+    def attach_references(documents):
+        """Заполняет у документов (и их строк) связи с контрагентом и товарами из ReferenceCache.
+
+        Счета-фактуры - через заказ. Возвращает тот же список документов.
+        """
+        headers = []
+        for document in documents:
+            if isinstance(document, Invoice):
+                document = document.order
+            if document is not None:
+                headers.append(document)
+        customers = ReferenceCache.get_many(Customer, (
+            getattr(document, DocumentQueries.COUNTERPARTIES[type(document)][0]) for document in headers
+        ))
+        products = ReferenceCache.get_many(Product, (
+            item.product_id for document in headers for item in document.items
+        ))
+        # Как при жадной загрузке: значения связей проставляются без пометки об изменении
+        for document in headers:
+            column, relationship = DocumentQueries.COUNTERPARTIES[type(document)]
+            set_committed_value(document, relationship, customers.get(getattr(document, column)))
+            for item in document.items:
+                set_committed_value(item, 'product', products.get(item.product_id))
+        return documents
@@ -0,0 +1,71 @@
+from jinja2 import Environment, DictLoader, select_autoescape
+import hashlib
+
+class DocumentRenderer:
+    """Реестр шаблонов печатных форм и XML-документов.
+
+    Все шаблоны живут в одном окружении Jinja и компилируются один раз
+    (при старте приложения через warm_up или при первом обращении),
+    а не на каждый запрос, как render_template_string.
+    Формат шаблона определяется расширением имени: .html, .xml.
+    """
+
+    # Экранирование включено для обоих форматов: данные контрагентов и товаров
+    # подставляются как есть и не должны ломать разметку
+    AUTOESCAPE_FORMATS = ('html', 'xml')
+    MIMETYPES = {'html': 'text/html', 'xml': 'application/xml'}
+
+    _sources = {}
+    _fingerprint = None
+    environment = Environment(
+        loader=DictLoader(_sources),
+        autoescape=select_autoescape(enabled_extensions=AUTOESCAPE_FORMATS, default=True),
+        auto_reload=False,
+        cache_size=-1
+    )
+
+    @staticmethod
+    def register(name, source):
+        """Регистрирует шаблон под именем вида 'invoice.html'"""
+        existing = DocumentRenderer._sources.get(name)
+        if existing is not None and existing != source:
+            raise ValueError(f'Template {name} is already registered')
+        DocumentRenderer._sources[name] = source
+        DocumentRenderer._fingerprint = None
+
+    @staticmethod
+    def names():
+        return sorted(DocumentRenderer._sources)
+
+    @staticmethod
+    def fingerprint():
+        """Хэш исходников всех зарегистрированных шаблонов (считается заново после register)"""
+        if DocumentRenderer._fingerprint is None:
+            sources = [(name, DocumentRenderer._sources[name]) for name in DocumentRenderer.names()]
+            DocumentRenderer._fingerprint = hashlib.sha256(repr(sources).encode('utf-8')).hexdigest()
+        return DocumentRenderer._fingerprint
+
+    @staticmethod
+    def get_template(name):
+        """Скомпилированный шаблон из кэша окружения"""
+        return DocumentRenderer.environment.get_template(name)
+
+    @staticmethod
+    def render(name, **context):
+        return DocumentRenderer.get_template(name).render(**context)
+
+    @staticmethod
+    def render_block(name, block, **context):
+        """Отрисовывает один блок шаблона ({% block styles %}, {% block content %})"""
+        template = DocumentRenderer.get_template(name)
+        return ''.join(template.blocks[block](template.new_context(context)))
+
+    @staticmethod
+    def mimetype(name):
+        return DocumentRenderer.MIMETYPES.get(name.rsplit('.', 1)[-1], 'text/plain')
+
+    @staticmethod
+    def warm_up():
+        """Компилирует все зарегистрированные шаблоны заранее"""
+        for name in DocumentRenderer.names():
+            DocumentRenderer.get_template(name)
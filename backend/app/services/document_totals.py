@@ -0,0 +1,139 @@
+from app.models.models import Order, OrderItem, Invoice, GoodsReceipt, GoodsReceiptItem, GoodsIssue, GoodsIssueItem
+from app.models.types import Money
+from app.db import db
+
+class DocumentTotals:
+    """Итоги документов (сумма, в т.ч. НДС, количество строк), посчитанные в SQL.
+
+    Цены хранятся в копейках, сумма строки - round(цена * количество) в копейках,
+    поэтому итог документа - точная сумма целых чисел. Итоги любого количества
+    документов получаются одним запросом с GROUP BY.
+    Посчитанные итоги хранятся в заголовках документов (total, total_vat, line_count):
+    маршруты записи вызывают store после изменения строк, а списки, печать и отчёты
+    читают готовые значения, не обращаясь к строкам.
+    """
+
+    VAT_RATE = 20  # НДС в процентах, входит в цену
+
+    # Тип документа -> (модель строк, колонка id документа)
+    LINES = {
+        'order': (OrderItem, OrderItem.order_id),
+        'invoice': (OrderItem, Invoice.id),
+        'goods_receipt': (GoodsReceiptItem, GoodsReceiptItem.goods_receipt_id),
+        'goods_issue': (GoodsIssueItem, GoodsIssueItem.goods_issue_id),
+    }
+
+    HEADERS = {
+        'order': Order,
+        'invoice': Invoice,
+        'goods_receipt': GoodsReceipt,
+        'goods_issue': GoodsIssue,
+    }
+
+    @staticmethod
+    def line_amount(item_model):
+        """Сумма строки в копейках"""
+        return db.func.round(db.func.coalesce(item_model.price, 0) * item_model.quantity)
+
+    @staticmethod
+    def totals_query(doc_type):
+        """Запрос (document_id, line_count, total, total_vat, total_wo_vat); суммы в гривнах"""
+        if doc_type not in DocumentTotals.LINES:
+            raise ValueError(f'Unknown document type: {doc_type}')
+        item_model, document_id = DocumentTotals.LINES[doc_type]
+        total = db.func.sum(DocumentTotals.line_amount(item_model))
+        total_vat = db.func.round(total * DocumentTotals.VAT_RATE / (100.0 + DocumentTotals.VAT_RATE))
+        query = db.session.query(
+            document_id.label('document_id'),
+            db.func.count(item_model.id).label('line_count'),
+            db.type_coerce(total, Money).label('total'),
+            db.type_coerce(total_vat, Money).label('total_vat'),
+            db.type_coerce(total - total_vat, Money).label('total_wo_vat')
+        )
+        if doc_type == 'invoice':
+            # Строки счёта - строки заказа
+            query = query.select_from(Invoice).join(OrderItem, OrderItem.order_id == Invoice.order_id)
+        return query.group_by(document_id)
+
+    @staticmethod
+    def empty():
+        return {'line_count': 0, 'total': 0.0, 'total_vat': 0.0, 'total_wo_vat': 0.0}
+
+    @staticmethod
+    def for_documents(doc_type, document_ids):
+        """{id документа: итоги} для списка документов одним запросом"""
+        document_ids = set(document_ids)
+        if not document_ids:
+            return {}
+        _, document_id = DocumentTotals.LINES[doc_type]
+        rows = DocumentTotals.totals_query(doc_type).filter(document_id.in_(document_ids))
+        result = {doc_id: DocumentTotals.empty() for doc_id in document_ids}
+        for row in rows:
+            result[row.document_id] = {
+                'line_count': row.line_count,
+                'total': row.total,
+                'total_vat': row.total_vat,
+                'total_wo_vat': row.total_wo_vat
+            }
+        return result
+
+    @staticmethod
+    def for_document(doc_type, document_id):
+        return DocumentTotals.for_documents(doc_type, [document_id])[document_id]
+
+    @staticmethod
+    def store(doc_type, document_ids):
+        """Пересчитывает итоги и записывает их в заголовки документов (commit не выполняется)"""
+        document_ids = set(document_ids)
+        if not document_ids:
+            return
+        db.session.flush()
+        totals = DocumentTotals.for_documents(doc_type, document_ids)
+        model = DocumentTotals.HEADERS[doc_type]
+        for document in model.query.filter(model.id.in_(document_ids)):
+            document_totals = totals[document.id]
+            document.total = document_totals['total']
+            document.total_vat = document_totals['total_vat']
+            document.line_count = document_totals['line_count']
+
+    @staticmethod
+    def store_order(order_id):
+        """Итоги заказа и выставленных по нему счетов"""
+        DocumentTotals.store('order', [order_id])
+        DocumentTotals.store('invoice', [
+            invoice_id for invoice_id, in db.session.query(Invoice.id).filter(Invoice.order_id == order_id)
+        ])
+
+    @staticmethod
+    def of_header(document):
+        """Итоги из заголовка документа в формате for_documents"""
+        total = document.total or 0.0
+        total_vat = document.total_vat or 0.0
+        return {
+            'line_count': document.line_count or 0,
+            'total': total,
+            'total_vat': total_vat,
+            'total_wo_vat': round(total - total_vat, 2)
+        }
+
+    @staticmethod
+    def drift(doc_type):
+        """Документы, у которых итоги в заголовке расходятся с посчитанными по строкам.
+
+        Возвращает [(id, (total, total_vat, line_count) в заголовке, то же по строкам)].
+        """
+        model = DocumentTotals.HEADERS[doc_type]
+        computed = DocumentTotals.totals_query(doc_type).subquery()
+        computed_total = db.func.coalesce(computed.c.total, 0)
+        computed_vat = db.func.coalesce(computed.c.total_vat, 0)
+        computed_count = db.func.coalesce(computed.c.line_count, 0)
+        rows = db.session.query(
+            model.id, model.total, model.total_vat, model.line_count,
+            db.type_coerce(computed_total, Money), db.type_coerce(computed_vat, Money), computed_count
+        ).outerjoin(computed, computed.c.document_id == model.id).filter(db.or_(
+            model.total.is_(None), model.total_vat.is_(None), model.line_count.is_(None),
+            model.total != computed_total,
+            model.total_vat != computed_vat,
+            model.line_count != computed_count
+        )).order_by(model.id)
+        return [(row[0], tuple(row[1:4]), tuple(row[4:7])) for row in rows]
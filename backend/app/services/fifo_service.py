@@ -1,91 +1,283 @@
-from app.models.models import StockBatch, GoodsReceiptItem, GoodsIssueItem, GoodsReceipt, GoodsIssue
+from app.models.models import (
+    StockBatch, GoodsReceiptItem, GoodsIssueItem, GoodsReceipt, GoodsIssue, Product,
+    StockCheckpoint, StockAllocation
+)
+from app.models.types import Money
+from app.services.reservation_service import ReservationService
 from app.db import db
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import StaleDataError
 from datetime import datetime
+import random
+import time
 
 class FIFOService:
+    # Размер порции строк при потоковом чтении остатков
+    SNAPSHOT_CHUNK_SIZE = 1000
+
+    # Сколько раз повторяется операция с партиями при конфликте параллельных запросов
+    CONFLICT_RETRIES = 5
+    CONFLICT_MESSAGE = 'Stock was changed by a concurrent request, please retry'
+
     @staticmethod
-    def create_batches_from_receipt(receipt_id):
-        """Создаёт партии товара из приходной накладной"""
-        items = GoodsReceiptItem.query.filter_by(goods_receipt_id=receipt_id).all()
-        
-        for item in items:
-            # Создаём партию для каждого товара
-            batch = StockBatch(
-                product_id=item.product_id,
-                quantity=item.quantity,
-                received_date=datetime.utcnow().date(),
-                cost=item.price or 0
-            )
-            db.session.add(batch)
-        
-        db.session.commit()
-    
+    def is_conflict(error):
+        """Ошибка из-за параллельного изменения партий: версия партии изменилась
+        (StaleDataError) или база занята другим пишущим запросом"""
+        if isinstance(error, StaleDataError):
+            return True
+        return isinstance(error, OperationalError) and 'database is locked' in str(error.orig)
+
     @staticmethod
-    def get_available_stock(product_id):
-        """Получает доступные остатки товара по FIFO"""
-        batches = StockBatch.query.filter_by(product_id=product_id).filter(
-            StockBatch.quantity > 0
-        ).order_by(StockBatch.received_date.asc()).all()
-        
-        total_quantity = sum(batch.quantity for batch in batches)
-        return total_quantity, batches
-    
+    def pause_before_retry(attempt):
+        """Случайная, растущая с номером попытки пауза, чтобы параллельные запросы не столкнулись снова"""
+        time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+
     @staticmethod
-    def get_available_stock_on_date(product_id, date):
-        """Получает остатки товара по FIFO на указанную дату"""
-        # Суммируем все приходы до даты (включительно)
-        receipts = GoodsReceiptItem.query.filter_by(product_id=product_id).filter(
-            GoodsReceiptItem.goods_receipt.has(GoodsReceipt.date <= date)
-        ).all()
-        total_in = sum(item.quantity for item in receipts)
-        # Суммируем все расходы до даты (включительно)
-        issues = GoodsIssueItem.query.filter_by(product_id=product_id).filter(
-            GoodsIssueItem.goods_issue.has(GoodsIssue.date <= date)
-        ).all()
-        total_out = sum(item.quantity for item in issues)
-        available_quantity = total_in - total_out
-        batches = []
-        return max(available_quantity, 0), batches
+    def stock_snapshot_query(product_ids=None):
+        """Запрос остатков по товарам одним сгруппированным агрегатом.
+
+        available_to_promise - остаток за вычетом действующих резервов заказов.
+        """
+        available = db.func.coalesce(db.func.sum(StockBatch.quantity), 0)
+        reservations = ReservationService.reserved_quantities(product_ids)
+        # У товара не больше одной строки резервов: max только выводит её в группу
+        reserved = db.func.coalesce(db.func.max(reservations.c.reserved_quantity), 0)
+        query = db.session.query(
+            Product.id.label('product_id'),
+            Product.name.label('product_name'),
+            Product.unit.label('unit'),
+            available.label('available_quantity'),
+            reserved.label('reserved_quantity'),
+            (available - reserved).label('available_to_promise')
+        ).outerjoin(
+            StockBatch,
+            db.and_(StockBatch.product_id == Product.id, StockBatch.quantity > 0)
+        ).outerjoin(
+            reservations, reservations.c.product_id == Product.id
+        )
+        if product_ids is None:
+            query = query.filter(Product.type == 'product')
+        else:
+            query = query.filter(Product.id.in_(product_ids))
+        return query.group_by(Product.id, Product.name, Product.unit).order_by(Product.id)
+
+    @staticmethod
+    def iter_stock_snapshot(product_ids=None):
+        """Потоково отдаёт остатки товаров (все товары или заданный список)"""
+        query = FIFOService.stock_snapshot_query(product_ids)
+        for row in query.yield_per(FIFOService.SNAPSHOT_CHUNK_SIZE):
+            yield {
+                'product_id': row.product_id,
+                'product_name': row.product_name,
+                'available_quantity': row.available_quantity,
+                'reserved_quantity': row.reserved_quantity,
+                # Резервы могут превышать остаток (заказы не ограничены складом) - ATP не меньше нуля
+                'available_to_promise': max(row.available_to_promise, 0),
+                'unit': row.unit
+            }
+
+    @staticmethod
+    def batch_from_receipt_item(item):
+        """Партия по строке приходной накладной (датируется датой накладной)"""
+        return StockBatch(
+            product_id=item.product_id,
+            quantity=item.quantity,
+            received_date=item.goods_receipt.date,
+            cost=item.price or 0,
+            goods_receipt_item=item
+        )
     
     @staticmethod
-    def consume_stock(product_id, required_quantity):
-        """Списывает товар по FIFO"""
-        if required_quantity <= 0:
-            return True
-        
-        batches = StockBatch.query.filter_by(product_id=product_id).filter(
+    def latest_checkpoint(date):
+        """Дата последней контрольной точки остатков не позже указанной даты"""
+        if isinstance(date, datetime):
+            date = date.date()
+        return db.session.query(db.func.max(StockCheckpoint.period_end)).filter(
+            StockCheckpoint.period_end <= date
+        ).scalar()
+
+    @staticmethod
+    def stock_movements_query(date, product_ids=None, since=None):
+        """Подзапрос движений товара (приход +, расход -) до даты включительно.
+
+        Если задана since (дата контрольной точки), движения берутся только после неё,
+        а остатки на since подставляются из stock_checkpoint.
+        """
+        if isinstance(date, datetime):
+            date = date.date()
+        receipts = db.select(
+            GoodsReceiptItem.product_id.label('product_id'),
+            GoodsReceiptItem.quantity.label('quantity')
+        ).join(GoodsReceipt, GoodsReceipt.id == GoodsReceiptItem.goods_receipt_id).where(
+            GoodsReceipt.date <= date
+        )
+        issues = db.select(
+            GoodsIssueItem.product_id.label('product_id'),
+            (-GoodsIssueItem.quantity).label('quantity')
+        ).join(GoodsIssue, GoodsIssue.id == GoodsIssueItem.goods_issue_id).where(
+            GoodsIssue.date <= date
+        )
+        parts = []
+        if since is not None:
+            receipts = receipts.where(GoodsReceipt.date > since)
+            issues = issues.where(GoodsIssue.date > since)
+            checkpoints = db.select(
+                StockCheckpoint.product_id.label('product_id'),
+                StockCheckpoint.quantity.label('quantity')
+            ).where(StockCheckpoint.period_end == since)
+            if product_ids is not None:
+                checkpoints = checkpoints.where(StockCheckpoint.product_id.in_(product_ids))
+            parts.append(checkpoints)
+        if product_ids is not None:
+            receipts = receipts.where(GoodsReceiptItem.product_id.in_(product_ids))
+            issues = issues.where(GoodsIssueItem.product_id.in_(product_ids))
+        parts.extend([receipts, issues])
+        return db.union_all(*parts).subquery('movements')
+
+    @staticmethod
+    def stock_on_date_query(date, product_ids=None):
+        """Запрос остатков на дату по всем товарам за один сгруппированный проход"""
+        since = FIFOService.latest_checkpoint(date)
+        movements = FIFOService.stock_movements_query(date, product_ids, since)
+        balances = db.select(
+            movements.c.product_id,
+            db.func.sum(movements.c.quantity).label('quantity')
+        ).group_by(movements.c.product_id).subquery('balances')
+        query = db.session.query(
+            Product.id.label('product_id'),
+            Product.name.label('product_name'),
+            Product.unit.label('unit'),
+            db.func.coalesce(balances.c.quantity, 0).label('available_quantity')
+        ).outerjoin(balances, balances.c.product_id == Product.id)
+        if product_ids is None:
+            query = query.filter(Product.type == 'product')
+        else:
+            query = query.filter(Product.id.in_(product_ids))
+        return query.order_by(Product.id)
+
+    @staticmethod
+    def iter_stock_on_date(date, product_ids=None):
+        """Потоково отдаёт остатки товаров на дату (отрицательные обнуляются)"""
+        query = FIFOService.stock_on_date_query(date, product_ids)
+        for row in query.yield_per(FIFOService.SNAPSHOT_CHUNK_SIZE):
+            yield {
+                'product_id': row.product_id,
+                'product_name': row.product_name,
+                'available_quantity': max(row.available_quantity, 0),
+                'unit': row.unit
+            }
+
+    @staticmethod
+    def load_open_batches(product_ids):
+        """Загружает открытые партии всех товаров одним запросом: {product_id: [партии по FIFO]}"""
+        product_ids = set(product_ids)
+        if not product_ids:
+            return {}
+        batches = StockBatch.query.filter(
+            StockBatch.product_id.in_(product_ids),
             StockBatch.quantity > 0
-        ).order_by(StockBatch.received_date.asc()).all()
-        
-        remaining_quantity = required_quantity
-        
+        ).order_by(
+            StockBatch.product_id, StockBatch.received_date.asc(), StockBatch.id.asc()
+        ).all()
+        open_batches = {}
         for batch in batches:
-            if remaining_quantity <= 0:
-                break
-                
-            if batch.quantity >= remaining_quantity:
-                batch.quantity -= remaining_quantity
-                remaining_quantity = 0
-            else:
-                remaining_quantity -= batch.quantity
-                batch.quantity = 0
-        
-        db.session.commit()
-        return remaining_quantity == 0
-    
+            open_batches.setdefault(batch.product_id, []).append(batch)
+        return open_batches
+
     @staticmethod
-    def validate_stock_for_issue(items):
-        """Проверяет достаточность остатков для расходной накладной"""
+    def check_stock(lines, open_batches):
+        """Ошибки нехватки остатков для строк накладной по партиям, загруженным load_open_batches.
+
+        По одной ошибке на товар, которого не хватает:
+        {'product_id', 'required' - всего по строкам, 'available' - в партиях, 'shortage' - разница}.
+        """
+        required = {}
+        for line in lines:
+            required[line.product_id] = required.get(line.product_id, 0) + line.quantity
         errors = []
-        
-        for item in items:
-            available_quantity, _ = FIFOService.get_available_stock(item['product_id'])
-            if available_quantity < item['quantity']:
+        for product_id, required_quantity in required.items():
+            available_quantity = sum(batch.quantity for batch in open_batches.get(product_id, []))
+            if available_quantity < required_quantity:
                 errors.append({
-                    'product_id': item['product_id'],
-                    'required': item['quantity'],
+                    'product_id': product_id,
+                    'required': required_quantity,
                     'available': available_quantity,
-                    'shortage': item['quantity'] - available_quantity
+                    'shortage': required_quantity - available_quantity
                 })
-        
-        return errors 
\ No newline at end of file
+        return errors
+
+    @staticmethod
+    def allocate(lines, open_batches):
+        """Распределяет строки по партиям FIFO в памяти: [(строка, партия, количество)].
+
+        Остатки партий в open_batches уменьшаются; сколько не хватило, не распределяется.
+        """
+        allocations = []
+        for line in lines:
+            remaining_quantity = line.quantity
+            for batch in open_batches.get(line.product_id, []):
+                if remaining_quantity <= 0:
+                    break
+                if batch.quantity <= 0:
+                    continue
+                taken = min(batch.quantity, remaining_quantity)
+                batch.quantity -= taken
+                remaining_quantity -= taken
+                allocations.append((line, batch, taken))
+        return allocations
+
+    @staticmethod
+    def consume_stock_bulk(lines, strict=True):
+        """Списывает по FIFO товар для всех строк расходной накладной.
+
+        lines - строки GoodsIssueItem (новые или уже сохранённые).
+        Партии всех товаров читаются одним запросом, распределение идёт в памяти,
+        по каждой затронутой партии пишется StockAllocation (строка -> партия -> количество
+        -> себестоимость). commit не выполняется - изменения фиксирует вызывающий код
+        вместе с документом. Если остатков не хватает, ничего не изменяется и возвращается
+        список ошибок в формате check_stock. При strict=False списывается
+        сколько есть, а ошибки лишь возвращаются (используется при перестроении остатков).
+        """
+        open_batches = FIFOService.load_open_batches(line.product_id for line in lines)
+        errors = FIFOService.check_stock(lines, open_batches)
+        if errors and strict:
+            return errors
+        for line, batch, taken in FIFOService.allocate(lines, open_batches):
+            db.session.add(StockAllocation(
+                goods_issue_item=line,
+                stock_batch=batch,
+                product_id=line.product_id,
+                quantity=taken,
+                cost=batch.cost
+            ))
+        return errors
+
+    @staticmethod
+    def cogs_query(group_by='document', date_from=None, date_to=None, customer_id=None):
+        """Себестоимость списанного товара из журнала партий, сгруппированная по
+        документу ('document'), покупателю ('customer') или месяцу ('month')"""
+        keys = {
+            'document': [GoodsIssue.id.label('goods_issue_id'), GoodsIssue.date.label('date'), GoodsIssue.number.label('number')],
+            'customer': [GoodsIssue.customer_id.label('customer_id')],
+            'month': [db.func.strftime('%Y-%m', GoodsIssue.date).label('month')]
+        }
+        if group_by not in keys:
+            raise ValueError(f'Unknown group_by: {group_by}')
+        query = db.session.query(
+            *keys[group_by],
+            db.func.sum(StockAllocation.quantity).label('quantity'),
+            # cost в копейках: сумма округляется до копейки и переводится в гривны
+            db.type_coerce(db.func.round(db.func.sum(StockAllocation.quantity * StockAllocation.cost)), Money).label('cogs')
+        ).join(
+            GoodsIssueItem, GoodsIssueItem.id == StockAllocation.goods_issue_item_id
+        ).join(
+            GoodsIssue, GoodsIssue.id == GoodsIssueItem.goods_issue_id
+        )
+        if date_from is not None:
+            query = query.filter(GoodsIssue.date >= date_from)
+        if date_to is not None:
+            query = query.filter(GoodsIssue.date <= date_to)
+        if customer_id is not None:
+            query = query.filter(GoodsIssue.customer_id == customer_id)
+        group_columns = [column.element for column in keys[group_by]]
+        return query.group_by(*group_columns).order_by(*group_columns)
@@ -0,0 +1,113 @@
+from app.models.models import Product
+from app.db import db
+import difflib
+import re
+
+class ProductSearchService:
+    """Поиск товаров для сканера и подбора в документы.
+
+    Сначала - точное совпадение штрихкода (уникальный индекс), затем полнотекстовый
+    поиск по product_fts (название, описание, производитель, группа, подгруппа):
+    каждое слово запроса ищется как префикс, результаты ранжируются bm25.
+    Слово, которого нет в индексе даже как префикса, заменяется похожими словами
+    из словаря индекса (product_fts_vocab). Если SQLite собран без FTS5,
+    поиск идёт через LIKE по названию.
+    """
+
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 100
+
+    # Веса колонок product_fts для bm25: name, description, manufacturer, group, subgroup
+    COLUMN_WEIGHTS = (10.0, 1.0, 3.0, 2.0, 2.0)
+
+    # Похожие слова для исправления опечатки: не больше MAX_CORRECTIONS со сходством от SIMILARITY_CUTOFF
+    MAX_CORRECTIONS = 3
+    SIMILARITY_CUTOFF = 0.75
+
+    @staticmethod
+    def tokenize(query):
+        return re.findall(r'\w+', query.lower())
+
+    @staticmethod
+    def fts_available():
+        return db.session.execute(
+            db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'")
+        ).first() is not None
+
+    @staticmethod
+    def _has_prefix(token):
+        return db.session.execute(
+            db.text('SELECT 1 FROM product_fts_vocab WHERE term >= :token AND term < :bound LIMIT 1'),
+            {'token': token, 'bound': token + '\U0010ffff'}
+        ).first() is not None
+
+    @staticmethod
+    def corrections(token):
+        """Похожие на token слова словаря индекса (кандидаты - слова на ту же букву близкой длины)"""
+        candidates = db.session.execute(
+            db.text(
+                'SELECT term FROM product_fts_vocab WHERE term >= :first AND term < :bound '
+                'AND length(term) BETWEEN :shortest AND :longest'
+            ),
+            {
+                'first': token[0],
+                'bound': token[0] + '\U0010ffff',
+                'shortest': len(token) - 2,
+                'longest': len(token) + 2
+            }
+        ).scalars().all()
+        return difflib.get_close_matches(
+            token, candidates, n=ProductSearchService.MAX_CORRECTIONS, cutoff=ProductSearchService.SIMILARITY_CUTOFF
+        )
+
+    @staticmethod
+    def match_expression(tokens):
+        """Выражение MATCH: все слова как префиксы; слова с опечаткой - через OR похожих слов"""
+        terms = []
+        for token in tokens:
+            similar = [] if ProductSearchService._has_prefix(token) else ProductSearchService.corrections(token)
+            if similar:
+                terms.append('(' + ' OR '.join(f'"{word}"' for word in similar) + ')')
+            else:
+                terms.append(f'"{token}"*')
+        return ' '.join(terms)
+
+    @staticmethod
+    def _fts_ids(tokens, limit):
+        weights = ', '.join(str(weight) for weight in ProductSearchService.COLUMN_WEIGHTS)
+        rows = db.session.execute(
+            db.text(
+                f'SELECT rowid FROM product_fts WHERE product_fts MATCH :match '
+                f'ORDER BY bm25(product_fts, {weights}) LIMIT :limit'
+            ),
+            {'match': ProductSearchService.match_expression(tokens), 'limit': limit}
+        )
+        return [row_id for row_id, in rows]
+
+    @staticmethod
+    def _like_ids(tokens, limit):
+        query = db.session.query(Product.id)
+        for token in tokens:
+            # LIKE в SQLite не различает регистр только для латиницы
+            variants = {token, token.capitalize(), token.upper()}
+            query = query.filter(db.or_(*[Product.name.like(f'%{variant}%') for variant in variants]))
+        return [product_id for product_id, in query.order_by(Product.name, Product.id).limit(limit)]
+
+    @staticmethod
+    def search(query, limit=None):
+        """Товары по строке запроса (штрихкод или слова), лучшие совпадения первыми"""
+        limit = limit or ProductSearchService.DEFAULT_LIMIT
+        query = query.strip()
+        found = []
+        by_barcode = Product.query.filter_by(barcode=query).first() if query else None
+        if by_barcode is not None:
+            found.append(by_barcode.id)
+        tokens = ProductSearchService.tokenize(query)
+        if tokens and len(found) < limit:
+            search_ids = ProductSearchService._fts_ids if ProductSearchService.fts_available() else ProductSearchService._like_ids
+            found.extend(product_id for product_id in search_ids(tokens, limit + 1) if product_id not in found)
+        found = found[:limit]
+        if not found:
+            return []
+        products = {product.id: product for product in Product.query.filter(Product.id.in_(found))}
+        return [products[product_id] for product_id in found if product_id in products]
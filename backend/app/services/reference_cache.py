@@ -0,0 +1,142 @@
+from app.models.models import Product, Customer, DataVersion
+from app.db import db
+from sqlalchemy.orm import make_transient_to_detached
+from collections import OrderedDict
+import threading
+import time
+
+class ReferenceCache:
+    """Read-through кэш справочников (товары, контрагенты) в памяти процесса.
+
+    Хранятся значения колонок записи и её версия из data_version ('product/15');
+    запись живёт ttl секунд (REFERENCE_CACHE_TTL) и сбрасывается маршрутами
+    изменения товаров и контрагентов (invalidate). get_many одним запросом читает
+    версии нужных записей: найденные в кэше с той же версией собираются из
+    сохранённых значений, остальные читаются одним SELECT ... IN и попадают в кэш.
+    Версии увеличивают триггеры БД (миграция m0009), поэтому изменения из других
+    процессов видны сразу; в базе без них кэш полагается только на ttl.
+    Счётчики попаданий и промахов - stats().
+    """
+
+    MODELS = (Product, Customer)
+
+    ttl = 300
+    max_entries = 10000
+
+    _entries = OrderedDict()
+    _lock = threading.Lock()
+    # Номер поколения по таблице: запись, прочитанная до invalidate, в кэш не попадает
+    _generations = {model.__tablename__: 0 for model in MODELS}
+    _stats = {model.__tablename__: {'hits': 0, 'misses': 0} for model in MODELS}
+
+    @staticmethod
+    def init_app(app):
+        ReferenceCache.ttl = app.config.get('REFERENCE_CACHE_TTL', 300)
+        ReferenceCache.max_entries = app.config.get('REFERENCE_CACHE_SIZE', 10000)
+
+    @staticmethod
+    def _values(obj):
+        return {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+
+    @staticmethod
+    def _from_values(model, values):
+        """Запись в сессии по сохранённым значениям колонок (без запроса к БД)"""
+        obj = model(**values)
+        make_transient_to_detached(obj)
+        db.session.add(obj)
+        return obj
+
+    @staticmethod
+    def _versions(table, ids):
+        """{id: версия записи} одним запросом; 0 - запись не менялась после миграции m0009.
+        None, если версии таблицы не ведутся (нет строки коллекции)"""
+        names = {f'{table}/{record_id}': record_id for record_id in ids}
+        rows = dict(
+            db.session.query(DataVersion.name, DataVersion.version)
+            .filter(DataVersion.name.in_([table, *names]))
+        )
+        if table not in rows:
+            return None
+        return {record_id: rows.get(name, 0) for name, record_id in names.items()}
+
+    @staticmethod
+    def get_many(model, ids):
+        """{id: запись} для id из ids; отсутствующих в БД id в ответе нет"""
+        table = model.__tablename__
+        mapper = db.inspect(model)
+        found = {}
+        wanted = set()
+        for record_id in ids:
+            if record_id is None or record_id in found:
+                continue
+            # Запись уже в сессии - берём её, кэш не нужен
+            obj = db.session.identity_map.get(mapper.identity_key_from_primary_key((record_id,)))
+            if obj is not None:
+                found[record_id] = obj
+            else:
+                wanted.add(record_id)
+        if not wanted:
+            return found
+        now = time.monotonic()
+        # Версии читаются до записей: изменение между запросами лишь сбросит запись при следующем чтении
+        versions = ReferenceCache._versions(table, wanted) if ReferenceCache.ttl > 0 else None
+        cached = {}
+        with ReferenceCache._lock:
+            for record_id in wanted:
+                entry = ReferenceCache._entries.get((table, record_id))
+                if entry is not None and versions is not None and entry[2] != versions[record_id]:
+                    del ReferenceCache._entries[(table, record_id)]
+                    entry = None
+                if entry is not None and entry[0] > now:
+                    ReferenceCache._entries.move_to_end((table, record_id))
+                    cached[record_id] = entry[1]
+            generation = ReferenceCache._generations[table]
+            ReferenceCache._stats[table]['hits'] += len(cached)
+            ReferenceCache._stats[table]['misses'] += len(wanted) - len(cached)
+        for record_id, values in cached.items():
+            found[record_id] = ReferenceCache._from_values(model, values)
+        missing = wanted - cached.keys()
+        if not missing:
+            return found
+        loaded = model.query.filter(model.id.in_(missing)).all()
+        for obj in loaded:
+            found[obj.id] = obj
+        if ReferenceCache.ttl > 0:
+            expires_at = now + ReferenceCache.ttl
+            with ReferenceCache._lock:
+                if ReferenceCache._generations[table] == generation:
+                    for obj in loaded:
+                        version = versions[obj.id] if versions is not None else None
+                        ReferenceCache._entries[(table, obj.id)] = (expires_at, ReferenceCache._values(obj), version)
+                        ReferenceCache._entries.move_to_end((table, obj.id))
+                    while len(ReferenceCache._entries) > ReferenceCache.max_entries:
+                        ReferenceCache._entries.popitem(last=False)
+        return found
+
+    @staticmethod
+    def invalidate(model, ids=None):
+        """Сбрасывает записи с указанными id (или все записи таблицы)"""
+        table = model.__tablename__
+        with ReferenceCache._lock:
+            ReferenceCache._generations[table] += 1
+            if ids is None:
+                ids = [record_id for entry_table, record_id in ReferenceCache._entries if entry_table == table]
+            for record_id in ids:
+                ReferenceCache._entries.pop((table, record_id), None)
+
+    @staticmethod
+    def clear():
+        for model in ReferenceCache.MODELS:
+            ReferenceCache.invalidate(model)
+
+    @staticmethod
+    def stats():
+        """Попадания, промахи и количество записей по таблицам"""
+        with ReferenceCache._lock:
+            sizes = {table: 0 for table in ReferenceCache._stats}
+            for table, _ in ReferenceCache._entries:
+                sizes[table] += 1
+            return {
+                table: dict(counters, entries=sizes[table])
+                for table, counters in ReferenceCache._stats.items()
+            }
@@ -0,0 +1,185 @@
+from app.services.document_renderer import DocumentRenderer
+from collections import OrderedDict
+from datetime import date
+import hashlib
+import importlib
+import os
+import tempfile
+import threading
+
+class MemoryRenderCacheBackend:
+    """LRU-кэш в памяти процесса"""
+
+    def __init__(self, max_entries=500):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, version, content):
+        with self._lock:
+            self._entries[key] = (version, content)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class DiskRenderCacheBackend:
+    """Кэш в файлах: <directory>/<тип документа>/<id>.<формат>, первая строка - версия"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, key):
+        doc_type, doc_id, fmt = key
+        return os.path.join(self.directory, doc_type, f'{doc_id}.{fmt}')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8', newline='') as f:
+                version = f.readline().rstrip('\n')
+                return version, f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, version, content):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Пишем во временный файл и подменяем, чтобы читатели не видели половину документа
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(version + '\n')
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                os.remove(os.path.join(root, name))
+
+    def prune(self, code_version):
+        """Удаляет все файлы, если они сохранены другой версией шаблонов и кода (после обновления)"""
+        marker = os.path.join(self.directory, 'CODE_VERSION')
+        try:
+            with open(marker, encoding='utf-8') as f:
+                if f.read().strip() == code_version:
+                    return
+        except FileNotFoundError:
+            pass
+        self.clear()
+        os.makedirs(self.directory, exist_ok=True)
+        with open(marker, 'w', encoding='utf-8') as f:
+            f.write(code_version)
+
+class RenderCache:
+    """Кэш готовых печатных форм и XML по (тип документа, id, формат).
+
+    Рядом с результатом хранится версия - хэш полей документа, строк и связанных
+    записей, которые попадают в шаблон, а также исходников шаблонов и модулей,
+    собирающих данные для них (code_version). Если документ изменился любым путём
+    или после обновления изменился шаблон либо расчёт итогов, версия не совпадёт
+    и форма будет отрисована заново; маршруты изменения и удаления документов
+    дополнительно сбрасывают записи через invalidate.
+    Бэкенд задаётся настройками RENDER_CACHE_BACKEND ('memory', 'disk', 'none').
+    """
+
+    # page - содержимое печатной формы без обёртки <html>, для пакетной печати
+    FORMATS = ('html', 'xml', 'page')
+
+    # Модули, которые строят контекст шаблонов: их изменение меняет готовые формы
+    CONTEXT_MODULES = (
+        'app.api.invoice_api', 'app.api.goods_issue_api', 'app.api.goods_receipt_api',
+        'app.api.batch_print', 'app.services.document_totals',
+        'app.utils.number_to_words', 'app.utils.money',
+    )
+
+    backend = MemoryRenderCacheBackend()
+    _code_version = None
+
+    @staticmethod
+    def code_version():
+        """Хэш исходников шаблонов (DocumentRenderer.fingerprint) и модулей CONTEXT_MODULES"""
+        templates = DocumentRenderer.fingerprint()
+        if RenderCache._code_version is None or RenderCache._code_version[0] != templates:
+            digest = hashlib.sha256(templates.encode('utf-8'))
+            for name in RenderCache.CONTEXT_MODULES:
+                with open(importlib.import_module(name).__file__, 'rb') as f:
+                    digest.update(f.read())
+            RenderCache._code_version = (templates, digest.hexdigest())
+        return RenderCache._code_version[1]
+
+    @staticmethod
+    def init_app(app):
+        kind = app.config.get('RENDER_CACHE_BACKEND', 'memory')
+        if kind == 'memory':
+            RenderCache.backend = MemoryRenderCacheBackend(app.config.get('RENDER_CACHE_SIZE', 500))
+        elif kind == 'disk':
+            RenderCache.backend = DiskRenderCacheBackend(
+                app.config.get('RENDER_CACHE_DIR') or os.path.join(app.instance_path, 'render_cache')
+            )
+            RenderCache.backend.prune(RenderCache.code_version())
+        elif kind == 'none':
+            RenderCache.backend = None
+        else:
+            raise ValueError(f'Unknown RENDER_CACHE_BACKEND: {kind}')
+
+    @staticmethod
+    def _row_values(obj):
+        if obj is None:
+            return None
+        if isinstance(obj, (list, tuple)):
+            return [RenderCache._row_values(item) for item in obj]
+        return [
+            obj.__tablename__,
+            [
+                value.isoformat() if isinstance(value, date) else value
+                for value in (getattr(obj, column.key) for column in obj.__table__.columns)
+            ]
+        ]
+
+    @staticmethod
+    def fingerprint(*objects):
+        """Версия документа: sha256 по code_version и значениям колонок переданных записей (и списков записей)"""
+        payload = RenderCache.code_version() + repr(RenderCache._row_values(list(objects)))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def get_or_render(doc_type, doc_id, fmt, version, render):
+        """Возвращает форму из кэша, если версия совпадает, иначе вызывает render() и сохраняет результат"""
+        backend = RenderCache.backend
+        if backend is None:
+            return render()
+        key = (doc_type, doc_id, fmt)
+        entry = backend.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        content = render()
+        backend.set(key, version, content)
+        return content
+
+    @staticmethod
+    def invalidate(doc_type, doc_id):
+        """Сбрасывает все форматы документа"""
+        if RenderCache.backend is None:
+            return
+        for fmt in RenderCache.FORMATS:
+            RenderCache.backend.delete((doc_type, doc_id, fmt))
@@ -0,0 +1,162 @@
+from app.models.models import Order, OrderItem, GoodsIssue, GoodsIssueItem, StockReservation
+from app.db import db
+from datetime import datetime, timedelta
+import threading
+import time
+
+class ReservationService:
+    """Резервы товара под заказы.
+
+    Открытый заказ резервирует по каждому товару количество своих позиций за
+    вычетом уже отгруженного расходными накладными с этим заказом (order_id)
+    на RESERVATION_TTL_HOURS часов с момента записи; закрытый или отменённый
+    заказ резерв снимает. Резерв уменьшает доступное к обещанию количество
+    (available_to_promise в FIFOService.stock_snapshot_query), но не партии:
+    списание по-прежнему делает расходная накладная. Накладная без order_id
+    резерв не уменьшает. Просроченные резервы удаляет фоновый
+    поток (ReservationSweeper) порциями по индексу expires_at; он запускается
+    первым HTTP-запросом, поэтому команды flask и скрипты его не запускают.
+    """
+
+    # Статусы заказа, которые не держат резерв (без учёта регистра)
+    CLOSED_STATUSES = ('cancelled', 'closed', 'completed')
+
+    # Сколько просроченных резервов удаляется за один запрос
+    EXPIRE_BATCH_SIZE = 500
+
+    ttl = timedelta(hours=72)
+
+    @staticmethod
+    def init_app(app):
+        ReservationService.ttl = timedelta(hours=app.config.get('RESERVATION_TTL_HOURS', 72))
+        interval = app.config.get('RESERVATION_SWEEP_INTERVAL', 60)
+        if interval > 0:
+            # Только в процессе, который обслуживает запросы (сервер), а не в командах и скриптах
+            app.before_request(lambda: ReservationSweeper.start(app, interval))
+
+    @staticmethod
+    def is_open(order):
+        return (order.status or '').lower() not in ReservationService.CLOSED_STATUSES
+
+    @staticmethod
+    def release(order_id):
+        StockReservation.query.filter_by(order_id=order_id).delete()
+
+    @staticmethod
+    def reserve_order(order, now=None):
+        """Пересоздаёт резервы заказа по текущим позициям (срок отсчитывается заново)"""
+        ReservationService._rebuild([order.id], now or datetime.utcnow(), renew=True)
+
+    @staticmethod
+    def refresh_orders(order_ids, now=None):
+        """Пересчитывает резервы заказов после изменения связанных с ними расходных накладных.
+
+        Срок действующих резервов сохраняется.
+        """
+        ReservationService._rebuild(order_ids, now or datetime.utcnow(), renew=False)
+
+    @staticmethod
+    def _rebuild(order_ids, now, renew):
+        """Резервы заказов = позиции - отгруженное накладными заказа; запросы общие на все заказы"""
+        order_ids = {order_id for order_id in order_ids if order_id is not None}
+        if not order_ids:
+            return
+        db.session.flush()
+        expiry = {} if renew else dict(
+            db.session.query(StockReservation.order_id, db.func.min(StockReservation.expires_at))
+            .filter(StockReservation.order_id.in_(order_ids))
+            .group_by(StockReservation.order_id)
+        )
+        StockReservation.query.filter(StockReservation.order_id.in_(order_ids)).delete(synchronize_session=False)
+        open_ids = [
+            order.id for order in db.session.query(Order.id, Order.status).filter(Order.id.in_(order_ids))
+            if ReservationService.is_open(order)
+        ]
+        if not open_ids:
+            return
+        shipped = {
+            (order_id, product_id): quantity for order_id, product_id, quantity in
+            db.session.query(GoodsIssue.order_id, GoodsIssueItem.product_id, db.func.sum(GoodsIssueItem.quantity))
+            .join(GoodsIssueItem, GoodsIssueItem.goods_issue_id == GoodsIssue.id)
+            .filter(GoodsIssue.order_id.in_(open_ids))
+            .group_by(GoodsIssue.order_id, GoodsIssueItem.product_id)
+        }
+        default_expiry = now + ReservationService.ttl
+        rows = []
+        for order_id, product_id, quantity in db.session.query(
+            OrderItem.order_id, OrderItem.product_id, db.func.sum(OrderItem.quantity)
+        ).filter(OrderItem.order_id.in_(open_ids)).group_by(OrderItem.order_id, OrderItem.product_id):
+            quantity -= shipped.get((order_id, product_id), 0)
+            if quantity > 0:
+                rows.append({
+                    'order_id': order_id, 'product_id': product_id, 'quantity': quantity,
+                    'expires_at': expiry.get(order_id, default_expiry)
+                })
+        if rows:
+            db.session.execute(db.insert(StockReservation), rows)
+
+    @staticmethod
+    def reserved_quantities(product_ids=None, now=None):
+        """Подзапрос (product_id, reserved_quantity): сумма действующих резервов по товарам.
+
+        Считается один раз на запрос (GROUP BY по индексу product_id, expires_at),
+        а не коррелированным подзапросом на каждый товар.
+        """
+        query = db.select(
+            StockReservation.product_id,
+            db.func.sum(StockReservation.quantity).label('reserved_quantity')
+        ).where(StockReservation.expires_at > (now or datetime.utcnow()))
+        if product_ids is not None:
+            query = query.where(StockReservation.product_id.in_(product_ids))
+        return query.group_by(StockReservation.product_id).subquery('reserved')
+
+    @staticmethod
+    def expire(now=None, batch_size=None):
+        """Удаляет просроченные резервы порциями с фиксацией каждой порции. Возвращает количество"""
+        now = now or datetime.utcnow()
+        batch_size = batch_size or ReservationService.EXPIRE_BATCH_SIZE
+        expired = 0
+        while True:
+            ids = db.session.query(StockReservation.id).filter(
+                StockReservation.expires_at <= now
+            ).order_by(StockReservation.expires_at).limit(batch_size).scalar_subquery()
+            deleted = db.session.execute(
+                db.delete(StockReservation).where(StockReservation.id.in_(ids)),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+            db.session.commit()
+            expired += deleted
+            if deleted < batch_size:
+                return expired
+
+class ReservationSweeper:
+    """Фоновый поток, раз в interval секунд снимающий просроченные резервы"""
+
+    _thread = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def start(app, interval):
+        if ReservationSweeper._thread is not None:
+            return
+        with ReservationSweeper._lock:
+            if ReservationSweeper._thread is not None:
+                return
+            ReservationSweeper._thread = threading.Thread(
+                target=ReservationSweeper._run, args=(app, interval),
+                name='reservation-sweeper', daemon=True
+            )
+            ReservationSweeper._thread.start()
+
+    @staticmethod
+    def _run(app, interval):
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    ReservationService.expire()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Reservation sweep failed')
+                finally:
+                    db.session.remove()
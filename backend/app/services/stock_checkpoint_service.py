@@ -0,0 +1,88 @@
+from app.models.models import StockCheckpoint, GoodsReceipt, GoodsIssue
+from app.services.fifo_service import FIFOService
+from app.db import db
+from datetime import datetime, timedelta
+
+class StockCheckpointService:
+    """Помесячные контрольные точки остатков.
+
+    Точка на period_end хранит остаток каждого товара с учётом всех документов
+    с датой <= period_end (нулевые остатки не сохраняются). Точки строятся только
+    для закрытых месяцев и последовательно, поэтому отчёт на дату берёт ближайшую
+    точку и досчитывает лишь движения после неё.
+    """
+
+    @staticmethod
+    def _as_date(value):
+        return value.date() if isinstance(value, datetime) else value
+
+    @staticmethod
+    def month_end(value):
+        """Последний день месяца указанной даты"""
+        next_month = value.replace(day=28) + timedelta(days=4)
+        return next_month - timedelta(days=next_month.day)
+
+    @staticmethod
+    def last_closed_period(today=None):
+        """Конец последнего полностью прошедшего месяца"""
+        today = StockCheckpointService._as_date(today or datetime.utcnow().date())
+        return today.replace(day=1) - timedelta(days=1)
+
+    @staticmethod
+    def invalidate(date):
+        """Удаляет точки, затронутые документом с указанной датой"""
+        if date is None:
+            return
+        date = StockCheckpointService._as_date(date)
+        StockCheckpoint.query.filter(StockCheckpoint.period_end >= date).delete(synchronize_session=False)
+
+    @staticmethod
+    def refresh(until=None):
+        """Достраивает недостающие точки до конца последнего закрытого месяца"""
+        until = StockCheckpointService._as_date(until) or StockCheckpointService.last_closed_period()
+        since = db.session.query(db.func.max(StockCheckpoint.period_end)).scalar()
+        if since is None:
+            first_dates = [
+                db.session.query(db.func.min(GoodsReceipt.date)).scalar(),
+                db.session.query(db.func.min(GoodsIssue.date)).scalar()
+            ]
+            first_dates = [d for d in first_dates if d is not None]
+            if not first_dates:
+                return 0
+            period_end = StockCheckpointService.month_end(min(first_dates))
+        else:
+            period_end = StockCheckpointService.month_end(since + timedelta(days=1))
+        built = 0
+        while period_end <= until:
+            StockCheckpointService._build_period(period_end, since)
+            since = period_end
+            period_end = StockCheckpointService.month_end(period_end + timedelta(days=1))
+            built += 1
+        return built
+
+    @staticmethod
+    def _build_period(period_end, since):
+        movements = FIFOService.stock_movements_query(period_end, since=since)
+        balance = db.func.sum(movements.c.quantity)
+        select = db.select(
+            db.literal(period_end, db.Date),
+            movements.c.product_id,
+            balance
+        ).group_by(movements.c.product_id).having(balance != 0)
+        db.session.execute(db.insert(StockCheckpoint).from_select(
+            ['period_end', 'product_id', 'quantity'], select
+        ))
+
+    @staticmethod
+    def on_document_change(*dates):
+        """Вызывается при проведении, изменении или удалении прихода/расхода"""
+        dates = [StockCheckpointService._as_date(d) for d in dates if d is not None]
+        if dates:
+            StockCheckpointService.invalidate(min(dates))
+        StockCheckpointService.refresh()
+
+    @staticmethod
+    def rebuild():
+        """Полностью пересчитывает все точки"""
+        StockCheckpoint.query.delete(synchronize_session=False)
+        return StockCheckpointService.refresh()
@@ -0,0 +1,193 @@
+from app.models.models import (
+    StockBatch, StockAllocation, GoodsReceipt, GoodsReceiptItem, GoodsIssue, GoodsIssueItem
+)
+from app.services.fifo_service import FIFOService
+from app.db import db
+from datetime import datetime
+
+class StockRepostService:
+    """Перепроведение партий и списаний при изменении или удалении документов.
+
+    Пересчитываются только товары, строки которых изменились, и только начиная
+    с самой ранней затронутой даты: партии от приходов с этой даты создаются заново,
+    а списания расходов с этой даты возвращаются и выполняются по FIFO повторно.
+    """
+
+    @staticmethod
+    def _as_date(value):
+        return value.date() if isinstance(value, datetime) else value
+
+    @staticmethod
+    def snapshot_lines(items):
+        """Снимок строк документа до изменения: [(id, product_id, quantity, price)]"""
+        return [(item.id, item.product_id, item.quantity, item.price) for item in items]
+
+    @staticmethod
+    def _lines_by_product(lines):
+        result = {}
+        for line in lines:
+            result.setdefault(line[1], []).append(line)
+        for product_lines in result.values():
+            product_lines.sort(key=lambda line: (line[2], line[3] is None, line[3] or 0))
+        return result
+
+    @staticmethod
+    def _line_values(product_lines):
+        return [(quantity, price) for _, _, quantity, price in product_lines]
+
+    @staticmethod
+    def changed_products(old_lines, new_lines, date_changed=False):
+        """Товары, строки которых отличаются в старой и новой версии документа"""
+        old = StockRepostService._lines_by_product(old_lines)
+        new = StockRepostService._lines_by_product(new_lines)
+        if date_changed:
+            return set(old) | set(new)
+        return {
+            product_id for product_id in set(old) | set(new)
+            if StockRepostService._line_values(old.get(product_id, [])) != StockRepostService._line_values(new.get(product_id, []))
+        }
+
+    @staticmethod
+    def _relink_map(old_lines, new_lines, unchanged_products):
+        """Соответствие id старых строк новым для товаров без изменений"""
+        old = StockRepostService._lines_by_product(old_lines)
+        new = StockRepostService._lines_by_product(new_lines)
+        mapping = {}
+        for product_id in unchanged_products:
+            for old_line, new_line in zip(old.get(product_id, []), new.get(product_id, [])):
+                if old_line[0] != new_line[0]:
+                    mapping[old_line[0]] = new_line[0]
+        return mapping
+
+    @staticmethod
+    def repost_receipt(old_date, old_lines, receipt=None):
+        """Перепроводит приходную накладную после изменения (receipt=None - после удаления)"""
+        db.session.flush()
+        new_lines, new_date = [], None
+        if receipt is not None:
+            new_lines = StockRepostService.snapshot_lines(
+                GoodsReceiptItem.query.filter_by(goods_receipt_id=receipt.id).all()
+            )
+            new_date = StockRepostService._as_date(receipt.date)
+        old_date = StockRepostService._as_date(old_date)
+        date_changed = new_date is not None and new_date != old_date
+        changed = StockRepostService.changed_products(old_lines, new_lines, date_changed)
+        unchanged = {line[1] for line in old_lines} - changed
+        mapping = StockRepostService._relink_map(old_lines, new_lines, unchanged)
+        if mapping:
+            for batch in StockBatch.query.filter(StockBatch.goods_receipt_item_id.in_(mapping)).all():
+                batch.goods_receipt_item_id = mapping[batch.goods_receipt_item_id]
+        from_date = min(d for d in (old_date, new_date) if d is not None)
+        return StockRepostService.repost(changed, from_date)
+
+    @staticmethod
+    def repost_issue(old_date, old_lines, issue=None):
+        """Перепроводит расходную накладную после изменения (issue=None - после удаления)"""
+        db.session.flush()
+        new_lines, new_date = [], None
+        if issue is not None:
+            new_lines = StockRepostService.snapshot_lines(
+                GoodsIssueItem.query.filter_by(goods_issue_id=issue.id).all()
+            )
+            new_date = StockRepostService._as_date(issue.date)
+        old_date = StockRepostService._as_date(old_date)
+        date_changed = new_date is not None and new_date != old_date
+        changed = StockRepostService.changed_products(old_lines, new_lines, date_changed)
+        unchanged = {line[1] for line in old_lines} - changed
+        mapping = StockRepostService._relink_map(old_lines, new_lines, unchanged)
+        if mapping:
+            for allocation in StockAllocation.query.filter(StockAllocation.goods_issue_item_id.in_(mapping)).all():
+                allocation.goods_issue_item_id = mapping[allocation.goods_issue_item_id]
+        from_date = min(d for d in (old_date, new_date) if d is not None)
+        return StockRepostService.repost(changed, from_date)
+
+    @staticmethod
+    def repost(product_ids, from_date):
+        """Перепроводит партии и списания товаров начиная с from_date.
+
+        commit не выполняется. Возвращает ошибки нехватки остатков в формате
+        FIFOService.check_stock; если они есть, вызывающий код должен откатить транзакцию.
+        """
+        product_ids = set(product_ids)
+        if not product_ids:
+            return []
+        from_date = StockRepostService._as_date(from_date)
+        db.session.flush()
+
+        # Партии от приходов с from_date и партии удалённых строк прихода создаются заново
+        later_receipt_items = db.select(GoodsReceiptItem.id).join(
+            GoodsReceipt, GoodsReceipt.id == GoodsReceiptItem.goods_receipt_id
+        ).where(GoodsReceiptItem.product_id.in_(product_ids), GoodsReceipt.date >= from_date)
+        receipt_item_exists = db.exists().where(GoodsReceiptItem.id == StockBatch.goods_receipt_item_id)
+        stale_batches_filter = db.and_(
+            StockBatch.product_id.in_(product_ids),
+            StockBatch.goods_receipt_item_id.isnot(None),
+            db.or_(StockBatch.goods_receipt_item_id.in_(later_receipt_items), ~receipt_item_exists)
+        )
+        stale_batch_ids = db.select(StockBatch.id).where(stale_batches_filter)
+
+        # Отменяем списания расходов с from_date, списания из пересоздаваемых партий
+        # и списания удалённых строк расхода
+        later_issue_items = db.select(GoodsIssueItem.id).join(
+            GoodsIssue, GoodsIssue.id == GoodsIssueItem.goods_issue_id
+        ).where(GoodsIssueItem.product_id.in_(product_ids), GoodsIssue.date >= from_date)
+        issue_item_exists = db.exists().where(GoodsIssueItem.id == StockAllocation.goods_issue_item_id)
+        allocations = StockAllocation.query.filter(
+            StockAllocation.product_id.in_(product_ids),
+            db.or_(
+                StockAllocation.goods_issue_item_id.in_(later_issue_items),
+                StockAllocation.stock_batch_id.in_(stale_batch_ids),
+                ~issue_item_exists
+            )
+        ).options(db.joinedload(StockAllocation.stock_batch)).all()
+        # Строки более ранних расходов, попавшие под отмену, перепроводятся целиком
+        replay_item_ids = {allocation.goods_issue_item_id for allocation in allocations}
+        handled_ids = {allocation.id for allocation in allocations}
+        allocations += StockAllocation.query.filter(
+            StockAllocation.goods_issue_item_id.in_(replay_item_ids),
+            StockAllocation.id.notin_(handled_ids)
+        ).options(db.joinedload(StockAllocation.stock_batch)).all()
+        stale_batches = StockBatch.query.filter(stale_batches_filter).all()
+        stale_ids = {batch.id for batch in stale_batches}
+        for allocation in allocations:
+            if allocation.stock_batch_id not in stale_ids:
+                allocation.stock_batch.quantity += allocation.quantity
+            db.session.delete(allocation)
+        for batch in stale_batches:
+            db.session.delete(batch)
+        db.session.flush()
+
+        receipt_items = GoodsReceiptItem.query.filter(
+            GoodsReceiptItem.id.in_(later_receipt_items)
+        ).options(db.joinedload(GoodsReceiptItem.goods_receipt)).all()
+        for item in receipt_items:
+            db.session.add(FIFOService.batch_from_receipt_item(item))
+
+        issue_items = GoodsIssueItem.query.join(
+            GoodsIssue, GoodsIssue.id == GoodsIssueItem.goods_issue_id
+        ).filter(
+            GoodsIssueItem.product_id.in_(product_ids),
+            db.or_(GoodsIssue.date >= from_date, GoodsIssueItem.id.in_(replay_item_ids))
+        ).order_by(GoodsIssue.date, GoodsIssue.id, GoodsIssueItem.id).all()
+        return FIFOService.consume_stock_bulk(issue_items)
+
+    @staticmethod
+    def rebuild_all():
+        """Полностью перестраивает stock_batch и журнал списаний по документам.
+
+        Возвращает товары, по которым расходы превышают приходы (списаны частично).
+        """
+        StockAllocation.query.delete(synchronize_session=False)
+        StockBatch.query.delete(synchronize_session=False)
+        db.session.expire_all()
+        receipt_items = GoodsReceiptItem.query.join(
+            GoodsReceipt, GoodsReceipt.id == GoodsReceiptItem.goods_receipt_id
+        ).options(db.contains_eager(GoodsReceiptItem.goods_receipt)).order_by(
+            GoodsReceipt.date, GoodsReceipt.id, GoodsReceiptItem.id
+        ).all()
+        for item in receipt_items:
+            db.session.add(FIFOService.batch_from_receipt_item(item))
+        issue_items = GoodsIssueItem.query.join(
+            GoodsIssue, GoodsIssue.id == GoodsIssueItem.goods_issue_id
+        ).order_by(GoodsIssue.date, GoodsIssue.id, GoodsIssueItem.id).all()
+        return FIFOService.consume_stock_bulk(issue_items, strict=False)
@@ -0,0 +1,16 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+CENT = Decimal('0.01')
+
+def to_minor_units(amount):
+    """Сумма в копейках (int) с округлением до копейки по правилу ROUND_HALF_UP.
+
+    float переводится в Decimal через str, чтобы 1.005 или 2.675 округлялись
+    так, как они записаны, а не по двоичному представлению.
+    """
+    amount = Decimal(str(amount)) if isinstance(amount, float) else Decimal(amount)
+    return int(amount.quantize(CENT, rounding=ROUND_HALF_UP) * 100)
+
+def from_minor_units(kopecks):
+    """Копейки -> сумма в гривнах (float с точностью до копейки)"""
+    return int(round(kopecks)) / 100
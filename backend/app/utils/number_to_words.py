@@ -1,27 +1,46 @@
+from functools import lru_cache
 from num2words import num2words
+from app.utils.money import to_minor_units
+
+# Копейки 0-99 прописью: считаются один раз при импорте
+KOPECK_WORDS = tuple(num2words(kopecks, lang='uk') for kopecks in range(100))
+
+@lru_cache(maxsize=8192)
+def _hryvnias_to_words(integer_part):
+    """Целая часть суммы прописью (кэшируется: в документах повторяются одни и те же суммы)"""
+    if integer_part == 0:
+        return "нуль"
+    return num2words(integer_part, lang='uk')
+
+@lru_cache(maxsize=8192)
+def _kopecks_to_words(kopecks):
+    integer_part, decimal_part = divmod(abs(kopecks), 100)
+    result = _hryvnias_to_words(integer_part)
+    if kopecks < 0:
+        result = "мінус " + result
+
+    # Добавляем валюту
+    result += " грн"
+
+    # Добавляем копейки, если они есть
+    if decimal_part > 0:
+        result += " " + KOPECK_WORDS[decimal_part] + " коп"
+    return result
 
 def number_to_words_ua(number):
-    """Переводит число в слова на украинском языке с использованием библиотеки num2words"""
+    """Переводит сумму в слова на украинском языке (гривны и копейки)"""
     try:
-        # Получаем целую и дробную части
-        integer_part = int(number)
-        decimal_part = round((number - integer_part) * 100)
-        
-        # Переводим целую часть
-        if integer_part == 0:
-            result = "нуль"
-        else:
-            result = num2words(integer_part, lang='uk')
-        
-        # Добавляем валюту
-        result += " грн"
-        
-        # Добавляем копейки, если они есть
-        if decimal_part > 0:
-            result += " " + num2words(decimal_part, lang='uk') + " коп"
-        
-        return result
-        
+        return _kopecks_to_words(to_minor_units(number))
     except Exception as e:
         # В случае ошибки возвращаем число как есть
-        return f"{number:.2f} грн" 
\ No newline at end of file
+        return f"{number:.2f} грн"
+
+def numbers_to_words_ua(numbers):
+    """Переводит список сумм в слова за один вызов; повторяющиеся суммы считаются один раз"""
+    cache = {}
+    result = []
+    for number in numbers:
+        if number not in cache:
+            cache[number] = number_to_words_ua(number)
+        result.append(cache[number])
+    return result
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк индексов миграции m0003: планы запросов и время горячих запросов
+FIFO/отчётов на синтетической базе до и после создания индексов.
+
+    python bench_indexes.py [--products 20000] [--documents 5000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from app import create_app
+from app.db import db
+from app.migrations import m0003_hot_indexes
+from app.models.models import StockBatch, GoodsIssue, GoodsIssueItem
+from app.services.fifo_service import FIFOService
+
+LINES_PER_DOCUMENT = 5
+
+def fill(products, documents):
+    random.seed(42)
+    start = date(2023, 1, 1)
+    conn = db.session.connection()
+    conn.exec_driver_sql(
+        'INSERT INTO product (id, name, type, unit) VALUES (?, ?, ?, ?)',
+        [(i, f'Товар {i}', 'product', 'шт') for i in range(1, products + 1)]
+    )
+    for table, item_table, fk in (('goods_receipt', 'goods_receipt_item', 'goods_receipt_id'),
+                                  ('goods_issue', 'goods_issue_item', 'goods_issue_id')):
+        conn.exec_driver_sql(
+            f'INSERT INTO {table} (id, date, number) VALUES (?, ?, ?)',
+            [(i, (start + timedelta(days=random.randint(0, 730))).isoformat(), str(i))
+             for i in range(1, documents + 1)]
+        )
+        conn.exec_driver_sql(
+            f'INSERT INTO {item_table} ({fk}, product_id, quantity, price) VALUES (?, ?, ?, ?)',
+            [(doc_id, random.randint(1, products), random.randint(1, 50), random.randint(1, 500))
+             for doc_id in range(1, documents + 1) for _ in range(LINES_PER_DOCUMENT)]
+        )
+    conn.exec_driver_sql(
+        'INSERT INTO stock_batch (product_id, quantity, received_date, cost) VALUES (?, ?, ?, ?)',
+        [(random.randint(1, products), random.randint(0, 50),
+          (start + timedelta(days=random.randint(0, 730))).isoformat(), random.randint(1, 500))
+         for _ in range(documents * LINES_PER_DOCUMENT)]
+    )
+    db.session.commit()
+
+def drop_indexes():
+    conn = db.session.connection()
+    for name, _, _ in m0003_hot_indexes.INDEXES:
+        conn.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+    db.session.commit()
+
+def hot_queries(products):
+    product_ids = list(range(1, products + 1, max(products // 50, 1)))
+    report_date = date(2024, 6, 30)
+    return [
+        ('stock snapshot', FIFOService.stock_snapshot_query()),
+        ('stock on date', FIFOService.stock_on_date_query(report_date)),
+        ('open batches (50 products)', StockBatch.query.filter(
+            StockBatch.product_id.in_(product_ids), StockBatch.quantity > 0
+        ).order_by(StockBatch.product_id, StockBatch.received_date, StockBatch.id)),
+        ('issues for a month', GoodsIssue.query.filter(
+            GoodsIssue.date.between(date(2024, 3, 1), date(2024, 3, 31))
+        ).order_by(GoodsIssue.date)),
+        ('lines of one issue', GoodsIssueItem.query.filter_by(goods_issue_id=123)),
+    ]
+
+def run(label, products):
+    print(f'\n=== {label} ===')
+    conn = db.session.connection()
+    for name, query in hot_queries(products):
+        statement = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+        plan = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}').fetchall()
+        timings = []
+        for _ in range(3):
+            started = time.perf_counter()
+            conn.exec_driver_sql(str(statement)).fetchall()
+            timings.append(time.perf_counter() - started)
+        print(f'{name}: {min(timings) * 1000:.1f} ms')
+        for row in plan:
+            print(f'    {row[-1]}')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--documents', type=int, default=5000)
+    args = parser.parse_args()
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        drop_indexes()
+        fill(args.products, args.documents)
+        run('without indexes', args.products)
+        m0003_hot_indexes.upgrade(db.session.connection())
+        db.session.commit()
+        run('with m0003 indexes', args.products)
+    os.remove(DB_PATH)
+
+if __name__ == '__main__':
+    main()
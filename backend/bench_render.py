@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк печатных форм: стоимость одного рендера через render_template_string
+(разбор и компиляция шаблона на каждый вызов) и через DocumentRenderer
+(шаблон скомпилирован один раз).
+
+    python bench_render.py [--lines 30] [--renders 200]
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+
+from flask import render_template_string
+from app import create_app
+from app.db import db
+from app.models.models import Customer, Product, Order, OrderItem, Invoice, GoodsIssue, GoodsIssueItem
+from app.services.document_renderer import DocumentRenderer
+from app.services.document_queries import DocumentQueries
+from app.utils.number_to_words import number_to_words_ua
+
+def fill(lines):
+    customer = Customer(name='ТОВ "Покупець"', edrpou='12345678', address='м. Київ')
+    products = [Product(name=f'Товар {i}', type='product', unit='шт') for i in range(lines)]
+    order = Order(customer=customer, date=date(2024, 6, 1), status='new')
+    issue = GoodsIssue(customer=customer, date=date(2024, 6, 1), number='1')
+    for i, product in enumerate(products):
+        order.items.append(OrderItem(product=product, quantity=i + 1, price=10.5))
+        issue.items.append(GoodsIssueItem(product=product, quantity=i + 1, price=10.5))
+    db.session.add_all([order, issue, Invoice(order=order, date=date(2024, 6, 1), total=0)])
+    db.session.commit()
+
+def contexts():
+    invoice = DocumentQueries.invoices(with_lines=True).first()
+    issue = DocumentQueries.goods_issues().first()
+    result = []
+    for name, key, document, items in (('invoice.html', 'invoice', invoice, invoice.order.items),
+                                       ('invoice.xml', 'invoice', invoice, invoice.order.items),
+                                       ('goods_issue.html', 'issue', issue, issue.items),
+                                       ('goods_issue.xml', 'issue', issue, issue.items)):
+        total = sum(item.price * item.quantity for item in items)
+        total_vat = total * 0.2 / 1.2
+        result.append((name, {
+            key: document,
+            'total': total,
+            'total_vat': total_vat,
+            'total_wo_vat': total - total_vat,
+            'total_words': number_to_words_ua(total),
+            'number_to_words_ua': number_to_words_ua
+        }))
+    return result
+
+def measure(render, renders):
+    started = time.perf_counter()
+    for _ in range(renders):
+        render()
+    return (time.perf_counter() - started) / renders * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=30)
+    parser.add_argument('--renders', type=int, default=200)
+    args = parser.parse_args()
+    app = create_app()
+    with app.app_context(), app.test_request_context():
+        db.create_all()
+        fill(args.lines)
+        print(f'{args.lines} lines, {args.renders} renders, ms per render')
+        for name, context in contexts():
+            source = DocumentRenderer._sources[name]
+            assert render_template_string(source, **context) == DocumentRenderer.render(name, **context)
+            uncached = measure(lambda: render_template_string(source, **context), args.renders)
+            cached = measure(lambda: DocumentRenderer.render(name, **context), args.renders)
+            print(f'{name:20} render_template_string: {uncached:6.2f}   DocumentRenderer: {cached:6.2f}   x{uncached / cached:.1f}')
+    os.remove(DB_PATH)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Проверка числа SQL-запросов: списки, печать и отчёты выполняются на базе с N
+документами каждого вида и на базе с N * scale, запросы к БД считаются
+слушателем before_cursor_execute. Если на большой базе какой-либо маршрут
+делает больше запросов, чем на маленькой (N+1 - ленивые связи, запрос в цикле),
+скрипт завершается с ошибкой.
+
+    python check_queries.py [--documents 10] [--scale 4] [--lines 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'queries.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+# Запросы идут через test_client: фоновая очистка резервов скрипту не нужна
+os.environ['RESERVATION_SWEEP_INTERVAL'] = '0'
+# Формы рендерятся на каждый запрос, как при первом обращении
+os.environ['RENDER_CACHE_BACKEND'] = 'none'
+
+from sqlalchemy import event
+from app import create_app
+from app.db import db
+from app.migrations import upgrade
+from app.services.reference_cache import ReferenceCache
+
+START = date(2024, 1, 1)
+PERIOD = 'date_from=2024-01-01&date_to=2024-12-31'
+
+ENDPOINTS = [
+    '/api/products/',
+    '/api/products/?limit=500',
+    '/api/customers/',
+    '/api/customers/?limit=500',
+    '/api/orders/',
+    '/api/orders/?limit=500',
+    '/api/invoices/',
+    '/api/invoices/?limit=500',
+    f'/api/invoices/print?{PERIOD}',
+    '/api/goods_receipts/',
+    '/api/goods_receipts/?limit=500',
+    f'/api/goods_receipts/print?{PERIOD}',
+    '/api/goods_issues/',
+    '/api/goods_issues/?limit=500',
+    '/api/goods_issues/?format=compact',
+    f'/api/goods_issues/print?{PERIOD}',
+    '/api/stock/',
+    '/api/stock/batches',
+    '/api/stock/cogs',
+    '/api/stock/cogs?group_by=customer',
+    '/api/stock/report?date=2024-12-31',
+    '/api/stock/report/print?date=2024-12-31',
+    f'/api/export/xml?{PERIOD}',
+]
+
+def post(client, url, payload):
+    response = client.post(url, json=payload)
+    assert response.status_code == 201, (url, response.get_json())
+    return response.get_json()['id']
+
+def fill(client, documents, lines, offset):
+    """Добавляет documents документов каждого вида (по lines строк) и справочники к ним"""
+    for number in range(offset, offset + documents):
+        day = (START + timedelta(days=number % 300)).isoformat()
+        customer_id = post(client, '/api/customers/', {'name': f'Контрагент {number}', 'edrpou': f'{number:08d}'})
+        products = [
+            post(client, '/api/products/', {'name': f'Товар {number}-{line}', 'type': 'product'})
+            for line in range(lines)
+        ]
+        post(client, '/api/goods_receipts/', {
+            'date': day, 'supplier_id': customer_id,
+            'items': [{'product_id': product_id, 'quantity': 10, 'price': 5} for product_id in products]
+        })
+        items = [{'product_id': product_id, 'quantity': 2, 'price': 8} for product_id in products]
+        order_id = post(client, '/api/orders/', {'date': day, 'customer_id': customer_id, 'items': items})
+        post(client, '/api/invoices/', {'date': day, 'order_id': order_id})
+        post(client, '/api/goods_issues/', {'date': day, 'customer_id': customer_id, 'items': items})
+
+def measure(app, statements):
+    """{маршрут: число запросов}; кэш справочников сбрасывается, чтобы считать худший случай"""
+    client = app.test_client()
+    counts = {}
+    for url in ENDPOINTS:
+        ReferenceCache.clear()
+        statements.clear()
+        response = client.get(url)
+        response.get_data()  # потоковые ответы выполняют запросы при чтении
+        assert response.status_code == 200, (url, response.status_code)
+        counts[url] = len(statements)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documents', type=int, default=10, help='документов каждого вида на малой базе')
+    parser.add_argument('--scale', type=int, default=4, help='во сколько раз больше большая база')
+    parser.add_argument('--lines', type=int, default=3, help='строк в документе')
+    args = parser.parse_args()
+    app = create_app()
+    statements = []
+    with app.app_context():
+        upgrade()
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *rest: statements.append(statement))
+        small = args.documents
+        large = args.documents * args.scale
+        fill(app.test_client(), small, args.lines, 0)
+        before = measure(app, statements)
+        fill(app.test_client(), large - small, args.lines, small)
+        after = measure(app, statements)
+        db.session.remove()
+        db.engine.dispose()
+    os.remove(DB_PATH)
+    print(f'{"endpoint":50} {small:>6} {large:>6}  documents')
+    failed = []
+    for url in ENDPOINTS:
+        grows = after[url] > before[url]
+        print(f'{url:50} {before[url]:6} {after[url]:6}' + ('  GROWS' if grows else ''))
+        if grows:
+            failed.append(url)
+    if failed:
+        print(f'query count grows with the number of documents: {", ".join(failed)}')
+        sys.exit(1)
+    print('ok')
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,24 @@
 import os
 
 class Config:
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///app.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SECRET_KEY = os.environ.get('SECRET_KEY', 'dev') 
\ No newline at end of file
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'dev')
+    # Кэш готовых печатных форм и XML: memory (LRU в процессе), disk или none
+    RENDER_CACHE_BACKEND = os.environ.get('RENDER_CACHE_BACKEND', 'memory')
+    RENDER_CACHE_SIZE = int(os.environ.get('RENDER_CACHE_SIZE', 500))
+    RENDER_CACHE_DIR = os.environ.get('RENDER_CACHE_DIR')
+    # Количество потоков рендера XML при выгрузке архивом (/api/export/xml)
+    EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 4))
+    # Кэш справочников (товары, контрагенты): срок жизни записи, секунд (0 - не кэшировать), и размер
+    REFERENCE_CACHE_TTL = float(os.environ.get('REFERENCE_CACHE_TTL', 300))
+    REFERENCE_CACHE_SIZE = int(os.environ.get('REFERENCE_CACHE_SIZE', 10000))
+    # Срок резерва товара под открытый заказ, часов
+    RESERVATION_TTL_HOURS = float(os.environ.get('RESERVATION_TTL_HOURS', 72))
+    # Период фоновой очистки просроченных резервов, секунд (0 - не запускать)
+    RESERVATION_SWEEP_INTERVAL = float(os.environ.get('RESERVATION_SWEEP_INTERVAL', 60))
+    # Сжатие ответов gzip/brotli (brotli - если установлен пакет brotli) от COMPRESS_MIN_SIZE байт
+    COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', '1') not in ('0', 'false', 'no')
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    # Сериализация JSON: orjson (если установлен) или default - стандартный json Flask
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'orjson')
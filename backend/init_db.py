@@ -1,7 +1,9 @@
 from app import create_app, db
+from app.migrations import upgrade
 
 app = create_app()
 
 with app.app_context():
     db.create_all()
+    upgrade()
     print('Database initialized!') 
\ No newline at end of file
@@ -0,0 +1,10 @@
+from app import create_app
+from app.migrations import upgrade
+
+app = create_app()
+
+with app.app_context():
+    applied = upgrade()
+    for name in applied:
+        print(f'Applied migration {name}')
+    print('Database is up to date!')
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Нагрузочная проверка списаний: несколько потоков одновременно проводят расходные
+накладные по одному товару (по одной и пакетами), приход меньше суммарного спроса.
+После прогона проверяется, что товара списано не больше, чем пришло, партии не ушли
+в минус, журнал списаний сходится с накладными, а остаток - с партиями.
+
+    python stress_stock.py [--workers 16] [--issues 40] [--stock 300] [--quantity 1]
+"""
+import argparse
+import os
+import tempfile
+import threading
+from collections import Counter
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), 'stress.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+# Запросы идут через test_client: фоновая очистка резервов скрипту не нужна
+os.environ['RESERVATION_SWEEP_INTERVAL'] = '0'
+
+from app import create_app
+from app.db import db
+from app.migrations import upgrade
+from app.models.models import StockBatch, StockAllocation, GoodsIssue, GoodsIssueItem
+
+def fill(client, stock):
+    product_id = client.post('/api/products/', json={'name': 'Товар', 'type': 'product'}).get_json()['id']
+    # Приход несколькими партиями, чтобы списания шли через границы партий
+    for day in range(1, 4):
+        response = client.post('/api/goods_receipts/', json={
+            'date': f'2024-01-0{day}',
+            'items': [{'product_id': product_id, 'quantity': stock / 3, 'price': 10 + day}]
+        })
+        assert response.status_code == 201, response.get_json()
+    return product_id
+
+STATUSES_LOCK = threading.Lock()
+
+def count(statuses, status):
+    with STATUSES_LOCK:
+        statuses[status] += 1
+
+def worker(app, product_id, issues, quantity, statuses, barrier):
+    client = app.test_client()
+    issue = {'date': '2024-02-01', 'items': [{'product_id': product_id, 'quantity': quantity, 'price': 20}]}
+    barrier.wait()
+    for number in range(issues):
+        if number % 4 == 3:
+            # Каждая четвёртая отправка - пакет из двух накладных
+            response = client.post('/api/goods_issues/bulk', json=[issue, issue])
+            for result in response.get_json()['results']:
+                count(statuses, 'bulk ' + ('posted' if 'id' in result else result['error']))
+        else:
+            response = client.post('/api/goods_issues/', json=issue)
+            count(statuses, response.status_code)
+
+def check(product_id, stock):
+    issued = db.session.query(db.func.coalesce(db.func.sum(GoodsIssueItem.quantity), 0)).scalar()
+    allocated = db.session.query(db.func.coalesce(db.func.sum(StockAllocation.quantity), 0)).scalar()
+    remaining = db.session.query(db.func.sum(StockBatch.quantity)).filter(StockBatch.product_id == product_id).scalar()
+    negative = StockBatch.query.filter(StockBatch.quantity < 0).count()
+    print(f'received {stock}, issued {issued} in {GoodsIssue.query.count()} issue(s), '
+          f'allocated {allocated}, remaining {remaining}')
+    assert issued <= stock + 1e-9, 'oversold'
+    assert negative == 0, 'negative batches'
+    assert abs(allocated - issued) < 1e-9, 'allocations do not match issues'
+    assert abs(remaining - (stock - issued)) < 1e-9, 'batches do not match issues'
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--issues', type=int, default=40, help='отправок на поток')
+    parser.add_argument('--stock', type=float, default=300)
+    parser.add_argument('--quantity', type=float, default=1)
+    args = parser.parse_args()
+    app = create_app()
+    with app.app_context():
+        upgrade()
+        product_id = fill(app.test_client(), args.stock)
+    statuses = Counter()
+    barrier = threading.Barrier(args.workers)
+    threads = [
+        threading.Thread(target=worker, args=(app, product_id, args.issues, args.quantity, statuses, barrier))
+        for _ in range(args.workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print('responses:', dict(statuses))
+    with app.app_context():
+        check(product_id, args.stock)
+        db.session.remove()
+        db.engine.dispose()
+    os.remove(DB_PATH)
+    print('ok')
+
+if __name__ == '__main__':
+    main()